@@ -0,0 +1,1004 @@
+import asyncio
+import importlib.util
+import os
+import sys
+import tempfile
+import threading
+import time
+import types
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from anvil import app
+import anvil.tables as tables
+from anvil.tables import app_tables
+
+from ... import auto, factories, helpers, history
+
+
+class TestIterTests:
+    def test_collection_order(self):
+        def slow():
+            time.sleep(0.05)
+
+        def fast():
+            pass
+
+        results = list(auto._iter_tests([slow, fast, slow, fast], workers=4))
+        names = [result.test_name for result in results]
+        expected = [auto._format_test_name(fn) for fn in [slow, fast, slow, fast]]
+        assert names == expected, f"Results are out of collection order: {names}"
+
+    def test_concurrent(self):
+        barrier = threading.Barrier(2, timeout=5)
+
+        def wait_a():
+            barrier.wait()
+
+        def wait_b():
+            barrier.wait()
+
+        results = list(auto._iter_tests([wait_a, wait_b], workers=2))
+        assert all(results), [str(result) for result in results if not result.success]
+
+    def test_serial(self):
+        lock = threading.Lock()
+        running = list()
+        overlaps = list()
+
+        def concurrent():
+            with lock:
+                running.append(1)
+            time.sleep(0.02)
+            with lock:
+                running.pop()
+
+        @auto.serial
+        def alone():
+            if running:
+                overlaps.append(len(running))
+
+        list(auto._iter_tests([alone, concurrent, alone, concurrent], workers=4))
+        assert not overlaps, f"serial test ran alongside {overlaps} other tests"
+
+    def test_serial_class(self):
+        @auto.serial
+        class Dummy:
+            def method(self):
+                pass
+
+        assert auto._is_serial(Dummy().method), "methods of a serial class are serial"
+
+
+class TestIterRun:
+    def __init__(self):
+        self.calls = list()
+        self.package = types.ModuleType("dummy_tests")
+
+        def test_first():
+            self.calls.append("first")
+
+        def test_second():
+            self.calls.append("second")
+            assert False, "second fails"
+
+        self.package.test_first = test_first
+        self.package.test_second = test_second
+
+    def test_yields_results(self):
+        results = list(auto.iter_run(self.package, history=False))
+        assert [result.success for result in results] == [True, False], results
+
+    def test_lazy(self):
+        results = auto.iter_run(self.package, history=False)
+        next(results)
+        assert self.calls == ["first"], f"second test should not have run yet: {self.calls}"
+        results.close()
+
+    def test_report_lines(self):
+        lines = list(auto.iter_report(self.package, quiet=True, history=False))
+        report = "\n".join(lines)
+        assert "Collected 2 tests" in report, report
+        assert "test_second" in report and "test_first" not in report, report
+        assert "1/2 passed" in report, report
+
+
+class TestDurations:
+    def test_timing_recorded(self):
+        def sleepy():
+            time.sleep(0.02)
+
+        result = auto._run_test(sleepy)
+        assert result.duration >= 0.02, f"wall time not recorded: {result.duration}"
+        assert result.cpu_time < result.duration, f"sleeping should not use cpu: {result.cpu_time}"
+
+    def test_timing_on_failure(self):
+        def failing():
+            time.sleep(0.01)
+            assert False, "expected failure"
+
+        result = auto._run_test(failing)
+        assert not result.success, "test should have failed"
+        assert result.duration >= 0.01, f"wall time not recorded: {result.duration}"
+
+    def test_slowest(self):
+        results = [
+            auto.TestResult(True, "a::test_fast", duration=0.001),
+            auto.TestResult(True, "a::test_slow", duration=2.0),
+            auto.TestResult(True, "b::test_medium", duration=0.5),
+        ]
+        log = auto._format_durations(results, 2)
+        report = "\n".join(log)
+        assert "slowest 2 durations" in report, report
+        assert "a::test_slow" in report and "b::test_medium" in report, report
+        assert "a::test_fast" not in report, f"Only the slowest 2 should be listed: {report}"
+        assert log.index(next(line for line in log if "test_slow" in line)) < log.index(
+            next(line for line in log if "test_medium" in line)
+        ), "slowest test should be listed first"
+
+
+class TestCollectionCache:
+    def __init__(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, "cached_tests.py")
+        with open(self.path, "w") as f:
+            f.write(
+                "created = []\n\ndef test_a():\n    pass\n\n"
+                "class TestB:\n    def __init__(self):\n        created.append(self)\n\n"
+                "    def test_c(self):\n        pass\n"
+            )
+
+        spec = importlib.util.spec_from_file_location("cached_tests", self.path)
+        self.module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(self.module)
+
+    def test_hit(self):
+        auto._find_tests(self.module)
+        before = auto.collection_cache_info()
+        found = auto._find_tests(self.module)
+        after = auto.collection_cache_info()
+        assert len(found) == 2, f"Expected 2 tests not {len(found)}"
+        assert after.hits == before.hits + 1, f"Expected a cache hit: {before} -> {after}"
+        assert after.misses == before.misses, f"Unexpected cache miss: {before} -> {after}"
+
+    def test_new_instances(self):
+        found = auto._find_tests(self.module)
+        auto._find_tests(self.module)
+        assert not self.module.created, "Test classes should not be created during collection"
+
+        method = next(test for test in found if isinstance(test, auto._MethodTest))
+        first, second = method.bind(), method.bind()
+        assert first.__self__ is not second.__self__, "Each run should get a new class instance"
+
+    def test_source_changed(self):
+        auto._find_tests(self.module)
+        before = auto.collection_cache_info()
+        mtime = os.path.getmtime(self.path) + 10
+        os.utime(self.path, (mtime, mtime))
+        auto._find_tests(self.module)
+        after = auto.collection_cache_info()
+        assert after.misses == before.misses + 1, f"Expected a cache miss: {before} -> {after}"
+
+    def test_no_source(self):
+        module = types.ModuleType("uncached_tests")
+        module.test_a = lambda: None
+        before = auto.collection_cache_info()
+        auto._find_tests(module)
+        after = auto.collection_cache_info()
+        assert before == after, f"Modules without a source file should not be cached: {before} -> {after}"
+
+
+class TestStaticDiscovery:
+    def __init__(self):
+        self.directory = tempfile.mkdtemp()
+        self.package_name = f"static_tests_{os.path.basename(self.directory)}"
+        package_dir = os.path.join(self.directory, self.package_name)
+        os.makedirs(os.path.join(package_dir, "nested"))
+        files = {
+            "__init__.py": "",
+            "test_mod.py": "def test_a():\n    pass\n\nclass TestB:\n    def test_c(self):\n        pass\n\n    def helper(self):\n        pass\n",
+            "no_tests.py": "raise RuntimeError('should never be imported')\n",
+            "nested/__init__.py": "",
+            "nested/deep.py": "async def test_d():\n    pass\n\ndef setup():\n    pass\n",
+        }
+        for name, source in files.items():
+            with open(os.path.join(package_dir, name), "w") as f:
+                f.write(source)
+
+    def test_parse_index(self):
+        import ast
+
+        tree = ast.parse("def test_a(): pass\nclass TestB:\n    def test_c(self): pass\nclass Other:\n    def test_d(self): pass\n")
+        index = auto._parse_index(tree.body)
+        assert index == [
+            ("class", "TestB", [("method", "test_c", None)]),
+            ("function", "test_a", None),
+        ], f"Unexpected index: {index}"
+
+    def test_lazy_import(self):
+        sys.path.insert(0, self.directory)
+        try:
+            found = auto._collect(self.package_name, "ast")
+        finally:
+            sys.path.remove(self.directory)
+
+        names = [auto._format_test_name(test, self.package_name) for test in found]
+        assert names == ["nested/deep::test_d", "test_mod::TestB::test_c", "test_mod::test_a"], names
+        assert f"{self.package_name}.no_tests" not in sys.modules, "modules without tests should not be imported"
+
+    def test_select(self):
+        sys.path.insert(0, self.directory)
+        try:
+            # report names are relative to a package called tests, the full path otherwise
+            select = [f"{self.package_name}/nested/deep::test_d"]
+            found = auto._collect(self.package_name, "ast", select=select)
+        finally:
+            sys.path.remove(self.directory)
+
+        names = [auto._format_test_name(test, self.package_name) for test in found]
+        assert names == ["nested/deep::test_d"], names
+        assert f"{self.package_name}.test_mod" not in sys.modules, "unselected modules should not be imported"
+
+    def test_parse_parametrized(self):
+        import ast
+
+        tree = ast.parse("@auto.parametrize('x', [1, 2])\ndef test_a(x): pass\n@staticmethod\ndef test_b(): pass\n")
+        index = auto._parse_index(tree.body)
+        assert index == [
+            ("function", "test_a", "parametrize"),
+            ("function", "test_b", None),
+        ], f"Unexpected index: {index}"
+
+    def test_keyword(self):
+        sys.path.insert(0, self.directory)
+        try:
+            found = auto._collect(self.package_name, "ast", keyword="deep")
+        finally:
+            sys.path.remove(self.directory)
+
+        names = [auto._format_test_name(test, self.package_name) for test in found]
+        assert names == ["nested/deep::test_d"], names
+        assert f"{self.package_name}.test_mod" not in sys.modules, "unmatched modules should not be imported"
+
+    def test_unknown_discovery(self):
+        with helpers.raises(ValueError):
+            auto._collect(self.package_name, "magic")
+
+
+class TestSelection:
+    def __init__(self):
+        self.created = list()
+        self.package = types.ModuleType("selection_tests")
+        created = self.created
+
+        class TestUpdate:
+            def __init__(self):
+                created.append("TestUpdate")
+
+            def test_forward(self):
+                pass
+
+            def test_missing(self):
+                pass
+
+        class TestOther:
+            def __init__(self):
+                created.append("TestOther")
+
+            def test_forward(self):
+                pass
+
+        def test_update_row():
+            pass
+
+        self.package.TestUpdate = TestUpdate
+        self.package.TestOther = TestOther
+        self.package.test_update_row = test_update_row
+
+    def _names(self, **kwargs):
+        return [
+            auto._format_test_name(test).split("::", 1)[1].split("<locals>::")[-1]
+            for test in auto._collect(self.package, **kwargs)
+        ]
+
+    def test_keyword(self):
+        names = self._names(keyword="update and not missing")
+        assert names == ["TestUpdate::test_forward", "test_update_row"], names
+
+    def test_keyword_parentheses(self):
+        names = self._names(keyword="(other or missing) and not row")
+        assert names == ["TestOther::test_forward", "TestUpdate::test_missing"], names
+
+    def test_keyword_errors(self):
+        for expression in ["update and", "(update", "update )", "and update"]:
+            with helpers.raises(ValueError):
+                auto._keyword_matcher(expression)
+
+    def test_select_not_instantiated(self):
+        names = self._names(keyword="test_update_row")
+        assert names == ["test_update_row"], names
+        assert not self.created, f"unselected classes were created: {self.created}"
+
+    def test_select_node(self):
+        selection = auto._Selection(["customer_service/test_util::TestA"])
+        assert selection.matches("customer_service/test_util::TestA::test_b")
+        assert not selection.matches("customer_service/test_util::TestAB::test_b")
+        assert selection.may_contain("app.tests.customer_service.test_util")
+        assert selection.may_contain("app.tests.customer_service")
+        assert not selection.may_contain("app.tests.billing")
+
+    def test_select_package(self):
+        selection = auto._Selection("customer_service")
+        assert selection.matches("customer_service/test_util::test_b")
+        assert selection.may_contain("app.tests.customer_service.test_util")
+        assert not selection.matches("customer_service_other/test_util::test_b")
+
+
+class TestParametrize:
+    def __init__(self):
+        self.log = list()
+        self.package = types.ModuleType("parametrize_tests")
+        log = self.log
+
+        def read_cases():
+            for value in range(4):
+                log.append(f"read {value}")
+                yield value
+
+        @auto.parametrize("value, expected", [(1, "1"), (2.5, "2.5"), (None, "x")], ids=["int", "float", "none"])
+        def test_format(value, expected):
+            assert str(value) == expected, f"{value} is not {expected}"
+
+        @auto.parametrize("value", read_cases)
+        def test_streamed(value):
+            log.append(f"run {value}")
+
+        class TestShared:
+            def __init__(self):
+                log.append("setup")
+
+            @auto.fixture(scope="class")
+            def prefix(self):
+                return "row"
+
+            @auto.parametrize("name", ["a", "b", "c"], ids=str.upper)
+            def test_case(self, prefix, name):
+                log.append(f"{prefix} {name}")
+
+        self.package.test_format = test_format
+        self.package.test_streamed = test_streamed
+        self.package.TestShared = TestShared
+        self.node = auto._format_test_name(test_format)
+
+    def _names(self, **kwargs):
+        return [auto._format_test_name(test).split("<locals>::")[-1] for test in auto._collect(self.package, **kwargs)]
+
+    def test_names(self):
+        names = self._names()
+        assert names == [
+            "TestShared::test_case[A]",
+            "TestShared::test_case[B]",
+            "TestShared::test_case[C]",
+            "test_format[int]",
+            "test_format[float]",
+            "test_format[none]",
+            "test_streamed[case0]",
+            "test_streamed[case1]",
+            "test_streamed[case2]",
+            "test_streamed[case3]",
+        ], names
+
+    def test_results(self):
+        results = {
+            result.test_name.split("<locals>::")[-1]: result for result in auto.iter_run(self.package, history=False)
+        }
+        assert len(results) == 10, list(results)
+        assert not results["test_format[none]"].success and results["test_format[float]"].success, list(results)
+        assert "None is not x" in str(results["test_format[none]"])
+
+    def test_shared_setup(self):
+        list(auto.iter_run(self.package, select=[f"{self.node.rpartition('::')[0]}::TestShared"], history=False))
+        assert self.log == ["setup", "row a", "row b", "row c"], f"cases should share one instance: {self.log}"
+
+    def test_streamed(self):
+        list(auto.iter_run(self.package, keyword="streamed", history=False))
+        runs = [entry for entry in self.log if entry.startswith("run")]
+        reads = [entry for entry in self.log if entry.startswith("read")]
+        assert runs == ["run 0", "run 1", "run 2", "run 3"], self.log
+        # once to collect the ids and once while running
+        assert len(reads) == 8, f"the case table should be read once per pass: {self.log}"
+
+    def test_select_case(self):
+        names = self._names(select=[f"{self.node}[float]"])
+        assert names == ["test_format[float]"], names
+        names = self._names(select=[self.node])
+        assert len(names) == 3, names
+        names = self._names(keyword="case2")
+        assert names == ["test_streamed[case2]"], names
+
+    def test_may_match(self):
+        selection = auto._Selection(["mod::test_x[case3]"])
+        assert selection.may_match("mod::test_x") and not selection.matches("mod::test_x")
+        assert selection.matches("mod::test_x[case3]") and not selection.matches("mod::test_x[case31]")
+        assert auto._format_node_id("app.tests.mod", "test_x[1.5]") == "mod::test_x[1.5]"
+
+    def test_errors(self):
+        with helpers.raises(ValueError):
+            auto.parametrize("", [1])
+
+        @auto.parametrize("a", [1])
+        def test_twice(a):
+            pass
+
+        with helpers.raises(ValueError):
+            auto.parametrize("b", [2])(test_twice)
+
+
+class TestRerunFailures:
+    def __init__(self):
+        self.history = history.FileHistory(os.path.join(tempfile.mkdtemp(), "history.json"))
+        self.calls = list()
+        self.package = types.ModuleType("rerun_tests")
+        calls = self.calls
+
+        def test_a():
+            calls.append("a")
+
+        def test_b():
+            calls.append("b")
+            assert False, "b fails"
+
+        def test_c():
+            calls.append("c")
+
+        self.package.test_a = test_a
+        self.package.test_b = test_b
+        self.package.test_c = test_c
+
+    def test_last_failed(self):
+        list(auto.iter_run(self.package, history=self.history))
+        self.calls.clear()
+        list(auto.iter_run(self.package, history=self.history, last_failed=True))
+        assert self.calls == ["b"], f"Only the failed test should run: {self.calls}"
+
+    def test_last_failed_none(self):
+        report = "\n".join(auto.iter_report(self.package, history=self.history, last_failed=True))
+        assert self.calls == ["a", "b", "c"], f"Everything should run without history: {self.calls}"
+        assert "No previously failed tests" in report, report
+
+    def test_renamed_failure(self):
+        list(auto.iter_run(self.package, history=self.history))
+        failed_name = auto._format_test_name(self.package.test_b)
+        del self.package.test_b
+        self.calls.clear()
+        report = "\n".join(auto.iter_report(self.package, history=self.history, last_failed=True))
+        assert self.calls == ["a", "c"], f"Everything should run when the failures are gone: {self.calls}"
+        assert "None of the previously failed tests were found" in report, report
+        assert failed_name not in self.history.load(f"{app.id}:{app.branch}"), "the missing test should be dropped"
+
+    def test_failed_first(self):
+        list(auto.iter_run(self.package, history=self.history))
+        self.calls.clear()
+        list(auto.iter_run(self.package, history=self.history, failed_first=True))
+        assert self.calls == ["b", "a", "c"], f"Failed test should run first: {self.calls}"
+
+
+FIXTURE_SOURCE = """
+from {auto} import fixture
+
+log = []
+
+@fixture(scope="session")
+def session_value():
+    log.append("session setup")
+    yield "session"
+    log.append("session teardown")
+
+@fixture(scope="module")
+def module_value(session_value):
+    log.append("module setup")
+    return f"{{session_value}}/module"
+
+@fixture
+def function_value():
+    log.append("function setup")
+    yield "function"
+    log.append("function teardown")
+
+def test_a(module_value, function_value):
+    log.append(f"test_a {{module_value}} {{function_value}}")
+
+def test_b(module_value):
+    log.append(f"test_b {{module_value}}")
+
+def test_missing(not_a_fixture):
+    pass
+
+class TestC:
+    @fixture(scope="class")
+    def schema(self):
+        log.append("class setup")
+        yield ["col"]
+        log.append("class teardown")
+
+    def test_d(self, schema):
+        log.append(f"test_d {{schema}}")
+
+    def test_e(self, schema):
+        log.append(f"test_e {{schema}}")
+"""
+
+
+class TestFixtures:
+    def __init__(self):
+        directory = tempfile.mkdtemp()
+        path = os.path.join(directory, "fixture_tests.py")
+        with open(path, "w") as f:
+            f.write(FIXTURE_SOURCE.format(auto=auto.__name__))
+
+        name = f"fixture_tests_{os.path.basename(directory)}"
+        spec = importlib.util.spec_from_file_location(name, path)
+        self.module = importlib.util.module_from_spec(spec)
+        sys.modules[name] = self.module
+        spec.loader.exec_module(self.module)
+        self.log = self.module.log
+
+    def _run(self, **kwargs):
+        found = auto._find_tests(self.module)
+        fixtures = auto._Fixtures(found)
+        try:
+            return {
+                result.test_name.split("::", 1)[1]: result
+                for result in auto._iter_tests(found, fixtures=fixtures, **kwargs)
+            }
+        finally:
+            fixtures.close()
+
+    def test_scopes(self):
+        results = self._run()
+        failed = [name for name, result in results.items() if not result.success]
+        assert failed == ["test_missing"], f"Unexpected failures: {failed}"
+        assert self.log == [
+            "class setup",
+            "test_d ['col']",
+            "test_e ['col']",
+            "class teardown",
+            "session setup",
+            "module setup",
+            "function setup",
+            "test_a session/module function",
+            "function teardown",
+            "test_b session/module",
+            "session teardown",
+        ], self.log
+
+    def test_missing_fixture(self):
+        result = self._run()["test_missing"]
+        assert "not_a_fixture" in str(result.error), f"Should name the missing fixture: {result.error}"
+
+    def test_concurrent(self):
+        results = self._run(workers=4)
+        assert sum(results.values()) == 4, [str(result) for result in results.values()]
+        assert self.log.count("session setup") == 1, self.log
+        assert self.log.count("class setup") == 1, self.log
+        assert self.log[-1] == "session teardown", self.log
+
+    def test_independent(self):
+        released = threading.Event()
+
+        class TestSlow:
+            @auto.fixture(scope="class")
+            def slow(self):
+                released.wait(5)
+                return "slow"
+
+            def test_a(self, slow):
+                pass
+
+        class TestFast:
+            @auto.fixture(scope="class")
+            def fast(self):
+                released.set()
+                return "fast"
+
+            def test_b(self, fast):
+                pass
+
+        tests = [auto._MethodTest(TestSlow, "test_a"), auto._MethodTest(TestFast, "test_b")]
+        fixtures = auto._Fixtures(tests)
+        start = time.perf_counter()
+        try:
+            results = list(auto._iter_tests(tests, workers=2, fixtures=fixtures))
+        finally:
+            fixtures.close()
+        assert all(result.success for result in results), [str(result) for result in results]
+        assert time.perf_counter() - start < 4, "a slow fixture should not hold up unrelated fixtures"
+
+    def test_unknown_scope(self):
+        with helpers.raises(ValueError):
+            auto.fixture(scope="package")
+
+    def test_scope_mismatch(self):
+        @auto.fixture
+        def narrow():
+            return 1
+
+        @auto.fixture(scope="module")
+        def wide(narrow):
+            return narrow
+
+        def test_wide(wide):
+            pass
+
+        self.module.narrow = narrow
+        self.module.wide = wide
+        test_wide.__module__ = self.module.__name__
+        result = auto._run_test(test_wide)
+        assert not result.success and "scoped" in str(result.error), f"expected a scope error: {result}"
+
+
+class TestMaxFail:
+    def __init__(self):
+        self.calls = list()
+        calls = self.calls
+
+        def passing():
+            calls.append("pass")
+
+        def failing():
+            time.sleep(0.01)
+            calls.append("fail")
+            assert False, "expected failure"
+
+        self.tests = [passing, failing, passing, failing, passing, failing, passing]
+
+    def test_sequential(self):
+        results = list(auto._iter_tests(self.tests, maxfail=2))
+        assert len(results) == 4, f"Should stop after the second failure: {len(results)}"
+        assert len(self.calls) == 4, f"Skipped tests should not run: {self.calls}"
+
+    def test_concurrent(self):
+        tests = self.tests + [self.tests[0]] * 50
+        results = list(auto._iter_tests(tests, workers=2, maxfail=1))
+        assert len(results) < len(tests), f"Tests should have been skipped: {len(results)}"
+        assert len(results) == len(self.calls), "Only tests that ran should be reported"
+
+    def test_no_limit(self):
+        results = list(auto._iter_tests(self.tests, workers=2))
+        assert len(results) == len(self.tests), "Everything should run without maxfail"
+
+    def test_report(self):
+        package = types.ModuleType("maxfail_tests")
+        for i, test in enumerate(self.tests):
+            setattr(package, f"test_{i}", test)
+
+        report = "\n".join(auto.iter_report(package, history=False, exitfirst=True))
+        assert "1/7 passed" in report, report
+        assert "5 tests skipped" in report and "maxfail=1" in report, report
+
+
+@auto.serial
+@auto.non_transactional
+class TestIsolation:
+    def __init__(self):
+        self.rows = list()
+
+    def _add_row(self):
+        self.rows.append(app_tables.test_table.add_row(text_col=helpers.gen_str()))
+
+    def test_transaction(self):
+        # not the bound method, the class is marked non_transactional
+        result = auto._run_test(lambda: self._add_row(), isolate="transaction")
+        assert result.success, str(result)
+        assert result.stray_rows == {"test_table": 1}, f"Expected one stray row: {result.stray_rows}"
+        with helpers.raises(tables.RowDeleted):
+            self.rows[0].get_id()
+
+    def test_non_transactional(self):
+        test = auto.non_transactional(lambda: self._add_row())
+        result = auto._run_test(test, isolate="transaction")
+        assert result.success, str(result)
+        assert result.stray_rows == {"test_table": 1}, f"Expected one stray row: {result.stray_rows}"
+        with helpers.raises(tables.RowDeleted):
+            self.rows[0].get_id()
+
+    def test_concurrent(self):
+        added = threading.Barrier(2)
+        package = types.ModuleType("isolation_tests")
+
+        @auto.non_transactional
+        def test_fast():
+            self._add_row()
+            added.wait(5)
+
+        @auto.non_transactional
+        def test_slow():
+            row = app_tables.test_table.add_row(text_col=helpers.gen_str())
+            added.wait(5)
+            time.sleep(0.05)
+            assert row.get_id(), "the other test should not delete this row"
+
+        package.test_fast, package.test_slow = test_fast, test_slow
+        results = list(auto.iter_run(package, workers=2, isolate="transaction", history=False))
+        assert all(result.success for result in results), [str(result) for result in results]
+        assert [result.stray_rows for result in results] == [{"test_table": 1}] * 2, [r.stray_rows for r in results]
+
+    def test_deleted_not_stray(self):
+        def test_temp():
+            with helpers.temp_row(app_tables.test_table, text_col=helpers.gen_str()):
+                pass
+
+        result = auto._run_test(auto.non_transactional(test_temp), isolate="transaction")
+        assert result.success and not result.stray_rows, f"deleted rows are not stray: {result.stray_rows}"
+
+    def test_clean(self):
+        result = auto._run_test(lambda: None, isolate="transaction")
+        assert result.success and not result.stray_rows, f"No rows should be reported: {result.stray_rows}"
+
+    def test_not_isolated(self):
+        result = auto._run_test(lambda: None)
+        assert result.stray_rows is None, "Stray rows are only counted when isolated"
+
+    def test_unknown(self):
+        result = auto._run_test(lambda: None, isolate="magic")
+        assert not result.success and "magic" in str(result.error), str(result)
+
+    def test_report(self):
+        results = [auto.TestResult(True, "mod::test_a", stray_rows={"test_table": 2})]
+        report = "\n".join(auto._format_stray_rows(results))
+        assert "1 tests left stray rows" in report and "test_table: 2" in report, report
+
+
+def _profiled_work():
+    return sum(i * i for i in range(1000))
+
+
+class TestProfile:
+    def test_off(self):
+        assert auto._run_test(_profiled_work).profile is None, "tests should not be profiled by default"
+
+    def test_profile(self):
+        result = auto._run_test(_profiled_work, profile=True)
+        assert result.success, str(result)
+        functions = {function for _, _, function in result.profile.stats}
+        assert "_profiled_work" in functions, functions
+
+    def test_report(self):
+        results = [auto._run_test(_profiled_work, profile=True) for _ in range(2)]
+        report = "\n".join(auto._format_profile(results, top=5, slowest=1))
+        assert "top 5 cumulative time" in report and "_profiled_work" in report, report
+        assert report.count("cumulative") >= 2, "expected the slowest test to be broken down"
+
+    def test_workers(self):
+        session = auto._Session(types.ModuleType("empty_tests"), workers=4, history=False, profile=True)
+        assert session.workers == 1 and session.profile == 20, (session.workers, session.profile)
+
+
+_leaked = list()
+
+
+def _leaky():
+    _leaked.append(bytearray(100_000))
+
+
+class TestMemory:
+    def test_off(self):
+        assert auto._run_test(_leaky).memory is None, "memory should not be traced by default"
+
+    def test_peak(self):
+        result = auto._run_test(lambda: bytearray(2_000_000), memory=True, memory_threshold=1_000_000)
+        assert result.success, str(result)
+        assert result.memory["peak"] >= 2_000_000 > result.memory["retained"], result.memory
+
+    def test_sites(self):
+        result = auto._run_test(_leaky, memory=True, memory_threshold=50_000)
+        assert result.memory["retained"] >= 100_000, result.memory
+        assert any("auto.py" in site for site, _, _ in result.memory["sites"]), result.memory["sites"]
+        report = "\n".join(auto._format_memory([result], 50_000))
+        assert "1 tests peaked over" in report and result.test_name in report, report
+
+    def test_leak_check(self):
+        result = auto._run_test(_leaky, leak_check=3)
+        assert len(result.memory["iterations"]) == 3 and auto._leaking(result.memory), result.memory
+        report = "\n".join(auto._format_memory([result], 10**9))
+        assert "1 tests leaking" in report, report
+
+    def test_no_leak(self):
+        result = auto._run_test(lambda: bytearray(100_000), leak_check=3)
+        assert not auto._leaking(result.memory), result.memory
+
+
+class TestTimeout:
+    def __init__(self):
+        self.release = threading.Event()
+
+    def _hang(self):
+        self.release.wait(5)
+
+    def test_timeout(self):
+        try:
+            result = auto._run_timed(self._hang, timeout=0.05)
+        finally:
+            self.release.set()
+        assert result.timed_out and not result.success, str(result)
+        assert result.duration < 1, f"should give up after the timeout: {result.duration}"
+        assert "_hang" in str(result.error), f"expected the stack of the stuck test: {result}"
+
+    def test_in_time(self):
+        result = auto._run_timed(lambda: None, timeout=5)
+        assert result.success and not result.timed_out, str(result)
+
+    def test_marker(self):
+        test = auto.timeout(0.05)(lambda: self._hang())
+        try:
+            result = auto._run_timed(test, timeout=60)
+        finally:
+            self.release.set()
+        assert result.timed_out, "the marked timeout should override the run's timeout"
+
+    def test_run_moves_on(self):
+        def test_quick():
+            pass
+
+        try:
+            results = list(auto._iter_tests([self._hang, test_quick], timeout=0.05))
+        finally:
+            self.release.set()
+        assert [result.success for result in results] == [False, True], [str(result) for result in results]
+
+
+class TestLoad:
+    def test_iterations(self):
+        calls = list()
+        results = auto.load(lambda: calls.append(1), concurrency=[1, 4], iterations=20)
+        assert [result.concurrency for result in results] == [1, 4], results
+        assert [result.calls for result in results] == [20, 20] and len(calls) == 40, results
+        assert all(result.p50 <= result.p95 <= result.p99 for result in results), results
+
+    def test_duration(self):
+        (result,) = auto.load(lambda: time.sleep(0.01), concurrency=2, duration=0.1)
+        assert result.calls >= 2 and result.ops_per_sec > 0, result
+
+    def test_errors(self):
+        def test_flaky():
+            assert next(counter) % 2, "even call"
+
+        counter = iter(range(10))
+        (result,) = auto.load(test_flaky, iterations=10)
+        assert result.errors == 5 and result.error_rate == 0.5, result
+        assert "even call" in str(result.error), result.error
+
+    def test_node_id(self):
+        (result,) = auto.load("history::TestOrdering::test_failed", sys.modules[__package__], iterations=3)
+        assert result.calls == 3 and not result.errors, result
+
+    def test_both(self):
+        with helpers.raises(ValueError):
+            auto.load(lambda: None, iterations=1, duration=1)
+
+
+class TestAsync:
+    def __init__(self):
+        self.log = list()
+        self.running = [0, 0]
+        self.package = types.ModuleType("async_tests")
+        log, running = self.log, self.running
+
+        async def wait(name):
+            running[0] += 1
+            running[1] = max(running)
+            try:
+                await asyncio.sleep(0.1)
+            finally:
+                running[0] -= 1
+            log.append((name, factories.current().seed))
+
+        async def test_a():
+            await wait("a")
+
+        async def test_b():
+            await wait("b")
+            assert False, "b fails after awaiting"
+
+        def test_c():
+            log.append(("c", None))
+
+        class TestD:
+            @auto.fixture(scope="class")
+            def prefix(self):
+                return "d"
+
+            async def test_e(self, prefix):
+                await wait(f"{prefix}e")
+
+        for name, test in [("test_a", test_a), ("test_b", test_b), ("test_c", test_c), ("TestD", TestD)]:
+            setattr(self.package, name, test)
+
+    def _run(self, **options):
+        return {
+            result.test_name.split("<locals>::")[-1]: result
+            for result in auto.iter_run(self.package, history=False, **options)
+        }
+
+    def test_awaited(self):
+        results = self._run()
+        assert not results["test_b"].success, "async tests should be awaited, not pass without running"
+        assert "b fails after awaiting" in str(results["test_b"])
+        assert results["test_a"].success and results["TestD::test_e"].success, [str(r) for r in results.values()]
+        assert self.running[1] == 1, "async tests run one at a time by default"
+
+    def test_concurrent(self):
+        start = time.perf_counter()
+        results = self._run(async_workers=10)
+        elapsed = time.perf_counter() - start
+        assert list(results) == ["TestD::test_e", "test_a", "test_b", "test_c"], list(results)
+        assert self.running[1] == 3, f"the async tests should run together: {self.running}"
+        assert elapsed < 0.25, f"3 tests sleeping 0.1s should take about 0.1s together, took {elapsed:.3f}s"
+        assert all(result.duration >= 0.1 for name, result in results.items() if name != "test_c"), results
+        assert not results["test_b"].success
+
+    def test_limit(self):
+        self._run(async_workers=2)
+        assert self.running[1] == 2, f"no more than 2 async tests should run at once: {self.running}"
+
+    def test_own_factory(self):
+        self._run(async_workers=10, seed=5)
+        seeds = dict(self.log)
+        assert seeds["a"].startswith("5:") and seeds["a"].endswith("test_a"), seeds
+        assert seeds["de"].endswith("TestD::test_e"), seeds
+
+    def test_timeout(self):
+        @auto.timeout(0.05)
+        async def test_stuck():
+            await asyncio.sleep(5)
+
+        package = types.ModuleType("async_timeout_tests")
+        package.test_stuck = test_stuck
+        start = time.perf_counter()
+        results = list(auto.iter_run(package, history=False, async_workers=2))
+        assert time.perf_counter() - start < 1, "the stuck test should be cancelled"
+        assert results[0].timed_out and isinstance(results[0].error, TimeoutError), str(results[0])
+        assert "test_stuck" in results[0].message, results[0].message
+
+    def test_isolate_note(self):
+        session = auto._Session(types.ModuleType("empty_tests"), history=False, isolate="transaction", async_workers=4)
+        assert session.async_workers == 1 and any("Async" in note for note in session.notes), session.notes
+
+
+class TestShards:
+    def test_sharded_run(self):
+        select = [
+            "history::TestOrdering::test_failed",
+            "history::TestOrdering::test_failed_first",
+            "history::TestShard::test_balanced",
+        ]
+        with ProcessPoolExecutor(max_workers=2) as executor:
+            session = auto._Session(
+                sys.modules[__package__], select=select, history=False, shards=2, shard_executor=executor
+            )
+            results = list(session)
+        assert [result.test_name for result in results] == select, [str(result) for result in results]
+        assert all(result.success for result in results), [str(result) for result in results]
+
+    def test_not_collected(self):
+        class Dropping(ThreadPoolExecutor):
+            """Shards that collect nothing, like a process that can't import the test modules"""
+
+            def submit(self, fn, package_name, select, options, modules):
+                return super().submit(fn, package_name, ["history::TestShard::test_gone"], options, [])
+
+        select = ["history::TestOrdering::test_failed", "history::TestShard::test_balanced"]
+        with Dropping(max_workers=2) as executor:
+            session = auto._Session(
+                sys.modules[__package__], select=select, history=False, shards=2, shard_executor=executor
+            )
+            results = list(session)
+        assert [result.test_name for result in results] == select, [str(result) for result in results]
+        assert not any(result.success for result in results), [str(result) for result in results]
+        assert "not run by shard" in results[0].message, results[0].message
+
+    def test_run_shard(self):
+        test_results, skipped = auto._run_shard(
+            __package__, ["history::TestOrdering::test_failed"], dict(maxfail=1), [f"{__package__}.history"]
+        )
+        assert [result.test_name for result in test_results] == ["history::TestOrdering::test_failed"]
+        assert skipped == [], skipped
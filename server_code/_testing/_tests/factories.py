@@ -0,0 +1,113 @@
+import datetime
+import threading
+import types
+import warnings
+
+from ... import auto, factories, fake_tables, helpers
+
+COLUMNS = [
+    {"name": "name", "type": "string"},
+    {"name": "age", "type": "number"},
+    {"name": "active", "type": "bool"},
+    {"name": "born", "type": "date"},
+    {"name": "seen", "type": "datetime"},
+    {"name": "tags", "type": "simpleObject"},
+    {"name": "owner", "type": "link_single"},
+    {"name": "friends", "type": "link_multiple"},
+]
+
+
+class TestSeed:
+    def test_same_seed(self):
+        first, second = factories.Factory(1234), factories.Factory(1234)
+        assert first.ints(100) == second.ints(100)
+        assert first.rows(5, COLUMNS[:-2]) == second.rows(5, COLUMNS[:-2])
+
+    def test_per_test(self):
+        run = factories.Factory(1234)
+        with factories.for_test("mod::test_a", run):
+            first = helpers.gen_int()
+        with factories.for_test("mod::test_a", factories.Factory(1234)):
+            again = helpers.gen_int()
+        with factories.for_test("mod::test_b", factories.Factory(1234)):
+            other = helpers.gen_str()
+        assert first == again, "the same test and seed should get the same values"
+        assert isinstance(other, str) and len(other) == 10, other
+
+    def test_session_note(self):
+        session = auto._Session(types.ModuleType("empty_tests"), history=False, seed=99)
+        assert "Random seed 99" in session.notes, session.notes
+        assert session.shard_options["seed"] == 99
+
+
+class TestUnique:
+    def test_bulk(self):
+        factory = factories.Factory()
+        values = factory.ints(10_000, n_digits=5)
+        assert len(set(values)) == 10_000
+        assert set(factory.ints(1000, n_digits=5)).isdisjoint(values), "values are never handed out twice"
+
+    def test_children_share(self):
+        factory = factories.Factory(1)
+        values = factory.child("a").strs(500, 3) + factory.child("b").strs(500, 3)
+        assert len(set(values)) == 1000
+
+    def test_exhausted(self):
+        factory = factories.Factory()
+        factory.ints(10, n_digits=1)
+        with helpers.raises(ValueError):
+            factory.ints(1, n_digits=1)
+
+    def test_large_space(self):
+        factory = factories.Factory()
+        assert len(factory.gen_str(32)) == 32 and factory.gen_int(19) < 10**19
+        assert len(set(factory.strs(100, 32))) == 100
+
+    def test_repeat_warning(self):
+        factory = factories.Factory()
+        factory.ints(10, n_digits=1)
+        with warnings.catch_warnings(record=True) as caught:
+            warnings.simplefilter("always")
+            assert 0 <= factory.gen_int(n_digits=1) < 10
+        assert caught and "repeat" in str(caught[0].message), caught
+
+    def test_threads(self):
+        factory = factories.Factory()
+        values = list()
+
+        def draw():
+            values.extend(factory.gen_int(4) for _ in range(500))
+
+        threads = [threading.Thread(target=draw) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert len(set(values)) == 2000
+
+    def test_gen_int(self):
+        values = {helpers.gen_int() for _ in range(5000)}
+        assert len(values) == 5000
+
+
+class TestRows:
+    def test_types(self):
+        owners = [{"name": "ann"}, {"name": "bob"}]
+        rows = factories.Factory().rows(20, COLUMNS, links={"owner": owners, "friends": owners})
+        assert len({row["name"] for row in rows}) == 20
+        row = rows[0]
+        assert isinstance(row["age"], int) and isinstance(row["active"], bool), row
+        assert isinstance(row["born"], datetime.date) and row["seen"].tzinfo is not None, row
+        assert isinstance(row["tags"], dict) and row["owner"] in owners, row
+        assert len(row["friends"]) == 2, row
+
+    def test_no_links(self):
+        row = factories.Factory().row({"columns": COLUMNS}, name="fixed")
+        assert row["name"] == "fixed" and row["owner"] is None and row["friends"] == [], row
+
+    def test_fake_table(self):
+        app_tables = fake_tables.FakeAppTables({"people": COLUMNS[:3], "pets": [{"name": "owner", "type": "link_single"}]})
+        app_tables.people.add_rows(factories.rows(10, app_tables.people.list_columns()))
+        pets = factories.rows(30, app_tables.pets.list_columns(), links={"owner": app_tables.people})
+        app_tables.pets.add_rows(pets)
+        assert len(app_tables.pets) == 30 and all(pet["owner"] for pet in app_tables.pets.search())
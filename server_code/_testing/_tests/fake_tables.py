@@ -0,0 +1,200 @@
+import threading
+import types
+
+import anvil.tables as tables
+
+from ... import auto, fake_tables, helpers
+
+DB_SCHEMA = {
+    "people": {
+        "columns": [
+            {"name": "name", "type": "string"},
+            {"name": "age", "type": "number"},
+            {"name": "tags", "type": "simpleObject"},
+        ]
+    },
+    "pets": [{"name": "owner", "type": "link_single"}],
+}
+
+
+class TestFakeTables:
+    def __init__(self):
+        self.app_tables = fake_tables.FakeAppTables(DB_SCHEMA)
+        self.people = self.app_tables.people
+
+    def test_tables(self):
+        assert "people" in self.app_tables and "missing" not in self.app_tables
+        assert list(self.app_tables) == ["people", "pets"]
+        assert self.app_tables["pets"] is self.app_tables.pets
+
+    def test_list_columns(self):
+        assert self.people.list_columns() == DB_SCHEMA["people"]["columns"]
+
+    def test_add_row(self):
+        row = self.people.add_row(name="ann", age=30)
+        assert row["name"] == "ann" and row["tags"] is None, dict(row)
+        assert set("[,]").issubset(row.get_id()), row.get_id()
+        assert self.people.get_by_id(row.get_id()) is row
+
+    def test_unknown_column(self):
+        with helpers.raises(KeyError):
+            self.people.add_row(height=2)
+
+    def test_search(self):
+        ann, bob, _ = self.people.add_rows([{"name": "ann", "age": 30}, {"name": "bob", "age": 30}, {"name": "cat"}])
+        assert self.people.search(age=30) == [ann, bob]
+        assert self.people.search(age=30, name="bob") == [bob]
+        assert len(self.people.search()) == 3
+
+    def test_index_follows_updates(self):
+        row = self.people.add_row(name="ann", age=30)
+        assert self.people.get(age=30) is row
+        row["age"] = 31
+        assert self.people.get(age=30) is None, "index still has the old value"
+        assert self.people.get(age=31) is row
+
+    def test_unhashable(self):
+        row = self.people.add_row(name="ann", tags=["a"])
+        assert self.people.search(tags=["a"]) == [row]
+
+    def test_unhashable_after_search(self):
+        ann = self.people.add_row(name="ann", tags="a")
+        assert self.people.search(tags="a") == [ann]
+        bob = self.people.add_row(name="bob", tags={"b": 1})
+        ann["tags"] = ["a"]
+        assert self.people.search(tags={"b": 1}) == [bob]
+        assert self.people.search(tags=["a"]) == [ann]
+        assert self.people.search(tags="a") == []
+
+    def test_get_many(self):
+        self.people.add_rows([{"name": "ann"}, {"name": "ann"}])
+        with helpers.raises(LookupError):
+            self.people.get(name="ann")
+
+    def test_delete(self):
+        row = self.people.add_row(name="ann")
+        row.delete()
+        assert self.people.search(name="ann") == []
+        with helpers.raises(tables.RowDeleted):
+            row["name"]
+
+    def test_link(self):
+        ann = self.people.add_row(name="ann")
+        pet = self.app_tables.pets.add_row(owner=ann)
+        assert self.app_tables.pets.get(owner=ann) is pet
+
+    def test_abort(self):
+        existing = self.people.add_row(name="ann", age=30)
+        removed = self.people.add_row(name="bob")
+        with self.app_tables.Transaction() as txn:
+            new = self.people.add_row(name="cat")
+            existing["age"] = 31
+            removed.delete()
+            txn.abort()
+
+        assert existing["age"] == 30, "update was not undone"
+        assert self.people.get(name="bob") is removed, "delete was not undone"
+        with helpers.raises(tables.RowDeleted):
+            new.get_id()
+
+    def test_nested_abort(self):
+        with self.app_tables.Transaction() as txn:
+            with self.app_tables.Transaction():
+                row = self.people.add_row(name="ann")
+            txn.abort()
+        assert len(self.people) == 0, "the outer abort should undo the inner transaction"
+        with helpers.raises(tables.RowDeleted):
+            row.get_id()
+
+    def test_error_aborts(self):
+        with helpers.raises(ValueError):
+            with self.app_tables.Transaction():
+                self.people.add_row(name="ann")
+                raise ValueError()
+        assert len(self.people) == 0
+
+    def test_threads(self):
+        added = threading.Barrier(2, timeout=5)
+        aborted = threading.Event()
+        rows = dict()
+
+        def abort():
+            with self.app_tables.Transaction() as txn:
+                self.people.add_row(name="ann")
+                added.wait()
+                txn.abort()
+            aborted.set()
+
+        def commit():
+            with self.app_tables.Transaction():
+                rows["bob"] = self.people.add_row(name="bob")
+                added.wait()
+                aborted.wait(5)
+
+        threads = [threading.Thread(target=abort), threading.Thread(target=commit)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert [row["name"] for row in self.people.search()] == ["bob"], "each thread has its own transaction"
+
+    def test_relaxed(self):
+        with self.app_tables.Transaction(relaxed=True):
+            self.people.add_row(name="ann")
+        add = self.app_tables.in_transaction(relaxed=True)(lambda: self.people.add_row(name="bob"))
+        add()
+        assert len(self.people) == 2
+
+    def test_query_operator(self):
+        operator = type("greater_than", (), {"__module__": "anvil.tables.query"})()
+        with helpers.raises(TypeError):
+            self.people.search(age=operator)
+        with helpers.raises(TypeError):
+            self.people.search(operator)
+
+
+@auto.serial
+class TestInstall:
+    def test_install(self):
+        real = tables.app_tables
+        fake = fake_tables.FakeAppTables(DB_SCHEMA)
+        with fake_tables.install(fake):
+            assert tables.app_tables is fake and auto.app_tables is fake
+        assert tables.app_tables is real and auto.app_tables is real, "app_tables was not restored"
+
+    def test_isolation(self):
+        fake = fake_tables.FakeAppTables(DB_SCHEMA)
+        with fake_tables.install(fake):
+            result = auto._run_test(lambda: fake.people.add_row(name="ann"), isolate="transaction")
+        assert result.success, str(result)
+        assert result.stray_rows == {"people": 1}, result.stray_rows
+        assert len(fake.people) == 0, "the isolated test's row was not undone"
+
+    def test_workers(self):
+        fake = fake_tables.FakeAppTables(DB_SCHEMA)
+        added = threading.Barrier(2, timeout=5)
+        package = types.ModuleType("fake_isolation_tests")
+
+        def test_a():
+            fake.people.add_row(name="ann")
+            added.wait()
+
+        def test_b():
+            row = fake.people.add_row(name="bob")
+            added.wait()
+            assert row["name"] == "bob", "the other test's abort should not undo this row"
+
+        package.test_a, package.test_b = test_a, test_b
+        results = list(auto.iter_run(package, workers=2, isolate="transaction", fake_tables=fake, history=False))
+        assert all(result.success for result in results), [str(result) for result in results]
+        assert [result.stray_rows for result in results] == [{"people": 1}] * 2, [r.stray_rows for r in results]
+        assert len(fake.people) == 0
+
+    def test_temp_row(self):
+        fake = fake_tables.FakeAppTables(DB_SCHEMA)
+        with fake_tables.install(fake):
+            with helpers.temp_row(fake.people, name="ann") as row:
+                assert fake.people.get(name="ann") is row
+            with helpers.temp_writes():
+                fake.people.add_row(name="bob")
+        assert len(fake.people) == 0
@@ -1,8 +1,8 @@
 import anvil.tables as tables
 from anvil.tables import app_tables
 
-from ... import helpers
-from ...helpers import gen_int, gen_str
+from ... import auto, helpers
+from ...helpers import gen_int, gen_str, schema_snapshot
 
 
 class TestGenInt:
@@ -53,17 +53,19 @@ class Test_VerifyColumn:
 
 
 class TestVerifyTable:
-    def __init__(self):
-        self.table_name = "test_table"
-        self.expected_columns = app_tables[self.table_name].list_columns()
+    table_name = "test_table"
+
+    @auto.fixture(scope="class")
+    def expected_columns(self):
+        return app_tables[self.table_name].list_columns()
 
-    def test_good_table(self):
-        result = helpers.verify_table(self.table_name, self.expected_columns)
+    def test_good_table(self, expected_columns):
+        result = helpers.verify_table(self.table_name, expected_columns)
         assert not result, f"Should not get errors: {result}"
 
-    def test_bad_table_name(self):
+    def test_bad_table_name(self, expected_columns):
         bad_table_name = "bad_table_name"
-        result = helpers.verify_table(bad_table_name, self.expected_columns)
+        result = helpers.verify_table(bad_table_name, expected_columns)
         if not isinstance(result, str):
             result = "\n".join(result)
         assert (
@@ -79,8 +81,8 @@ class TestVerifyTable:
             "not found" in result and "non_existant_row" in result
         ), f"Should get a column not found error: {result}"
 
-    def test_bad_table_column_type(self):
-        bad_columns = [dict(self.expected_columns[0])]
+    def test_bad_table_column_type(self, expected_columns):
+        bad_columns = [dict(expected_columns[0])]
         bad_columns[0]["type"] = "bad_type"
         result = helpers.verify_table(self.table_name, bad_columns)
         if not isinstance(result, str):
@@ -90,10 +92,87 @@ class TestVerifyTable:
         ), f"Should get a column type error: {result}"
 
 
+class TestVerifySchema:
+    expected = {
+        "test_table": {
+            "columns": [
+                {"name": "text_col", "type": "string"},
+                {"name": "number_col", "type": "number"},
+                {"name": "bool_col", "type": "bool"},
+            ]
+        }
+    }
+
+    def test_good_schema(self, schema_snapshot):
+        diffs = helpers.verify_schema(self.expected, schema_snapshot)
+        assert not diffs, [str(diff) for diff in diffs.values()]
+
+    def test_column_list(self, schema_snapshot):
+        expected = {"test_table": self.expected["test_table"]["columns"]}
+        diffs = helpers.verify_schema(expected, schema_snapshot)
+        assert not diffs, [str(diff) for diff in diffs.values()]
+
+    def test_differences(self, schema_snapshot):
+        expected = {
+            "test_table": [
+                {"name": "text_col", "type": "number"},
+                {"name": "number_col", "type": "number"},
+                {"name": "missing_col", "type": "string"},
+            ],
+            "missing_table": [],
+        }
+        diffs = helpers.verify_schema(expected, schema_snapshot)
+        diff = diffs["test_table"]
+        assert diff.missing == ["missing_col"], diff
+        assert diff.wrong_type == {"text_col": ("number", "string")}, diff
+        assert diff.extra == ["bool_col"], diff
+        assert diffs["missing_table"].table_missing, diffs["missing_table"]
+        assert "Table: test_table" in str(diff) and "missing_col" in str(diff), str(diff)
+
+    def test_ignore_extra(self, schema_snapshot):
+        expected = {"test_table": [{"name": "text_col", "type": "string"}]}
+        diffs = helpers.verify_schema(expected, schema_snapshot, ignore_extra=True)
+        assert not diffs, [str(diff) for diff in diffs.values()]
+
+    def test_snapshot_reused(self, schema_snapshot):
+        first = schema_snapshot.columns("test_table")
+        second = schema_snapshot.columns("test_table")
+        assert first is second, "the snapshot should only fetch a table once"
+        assert schema_snapshot.columns("missing_table") is None, "missing tables should be None"
+
+
+class TestAppSchema:
+    def test_load(self):
+        db_schema = helpers.load_db_schema(helpers)
+        columns = {column["name"]: column["type"] for column in db_schema["test_table"]["columns"]}
+        assert columns == {
+            "text_col": "string",
+            "number_col": "number",
+            "bool_col": "bool",
+        }, f"Unexpected columns for test_table: {columns}"
+
+    def test_cached(self):
+        assert helpers.load_db_schema(helpers) is helpers.load_db_schema(
+            helpers
+        ), "anvil.yaml should only be parsed once"
+
+    def test_verify(self, schema_snapshot):
+        diffs = helpers.verify_app_schema(helpers, schema_snapshot, tables=["test_table"])
+        assert not diffs, [str(diff) for diff in diffs.values()]
+
+    def test_undeclared_table(self, schema_snapshot):
+        diffs = helpers.verify_app_schema(helpers, schema_snapshot, tables=["not_declared"])
+        assert "not_declared" in diffs, "an undeclared table should be reported"
+
+
+@auto.non_transactional
 class TestTempRow:
     def __init__(self):
         self.table = app_tables.test_table
-        self.column_names = [column["name"] for column in self.table.list_columns()]
+
+    @auto.fixture(scope="class")
+    def column_names(self):
+        return [column["name"] for column in self.table.list_columns()]
 
     def test_row_instance(self):
         with helpers.temp_row(app_tables.test_table) as row:
@@ -122,23 +201,23 @@ class TestTempRow:
         with helpers.raises(tables.RowDeleted):
             row.get_id()
 
-    def test_empty_row(self):
+    def test_empty_row(self, column_names):
         with helpers.temp_row(app_tables.test_table) as row:
-            for column in self.column_names:
+            for column in column_names:
                 assert column in row, f"row should have column: '{column}'"
                 assert row[column] is None, f"row[{column}] should be None"
 
         with helpers.raises(tables.RowDeleted):
             row.get_id()
 
-    def test_populated_row(self):
+    def test_populated_row(self, column_names):
         expected_data = {
             "text_col": gen_str(),
             "number_col": gen_int(),
             "bool_col": True,
         }
         with helpers.temp_row(app_tables.test_table, **expected_data) as row:
-            for column in self.column_names:
+            for column in column_names:
                 assert (
                     row[column] == expected_data[column]
                 ), f"row[{column}] = {row[column]} expected {expected_data[column]}"
@@ -165,11 +244,58 @@ class TestTempRow:
             assert False, f"Error after deleting row within block: {e}"
 
 
-class TestTempWrites:
+@auto.non_transactional
+class TestTempRows:
     def __init__(self):
         self.table = app_tables.test_table
-        self.column_names = [column["name"] for column in self.table.list_columns()]
+        self.data = [{"text_col": gen_str(), "number_col": i} for i in range(5)]
+
+    def test_rows(self):
+        with helpers.temp_rows(self.table, self.data) as rows:
+            assert len(rows) == len(self.data), f"Expected {len(self.data)} rows not {len(rows)}"
+            for row, expected in zip(rows, self.data):
+                assert row["text_col"] == expected["text_col"], f"{dict(row)} != {expected}"
+
+        for row in rows:
+            with helpers.raises(tables.RowDeleted):
+                row.get_id()
+
+    def test_deleted_with_exception(self):
+        with helpers.raises(KeyboardInterrupt):
+            with helpers.temp_rows(self.table, self.data) as rows:
+                raise KeyboardInterrupt("Testing the exception does not keep the rows alive")
+
+        for row in rows:
+            with helpers.raises(tables.RowDeleted):
+                row.get_id()
+
+    def test_already_deleted(self):
+        try:
+            with helpers.temp_rows(self.table, self.data) as rows:
+                rows[0].delete()
+        except Exception as e:
+            assert False, f"Error after deleting a row within block: {e}"
 
+        for row in rows:
+            with helpers.raises(tables.RowDeleted):
+                row.get_id()
+
+    def test_dataset(self):
+        dataset = {"test_table": self.data[:2]}
+        with helpers.temp_dataset(dataset) as created:
+            rows = created["test_table"]
+            assert len(rows) == 2, f"Expected 2 rows not {len(rows)}"
+            assert rows[1]["number_col"] == 1, f"Unexpected row: {dict(rows[1])}"
+
+        for row in rows:
+            with helpers.raises(tables.RowDeleted):
+                row.get_id()
+
+
+@auto.non_transactional
+class TestTempWrites:
+    def __init__(self):
+        self.table = app_tables.test_table
         self.test_data = {"text_col": "abc", "number_col": 1234, "bool_col": True}
 
     def test_new_row(self):
@@ -263,3 +389,26 @@ class TestRaises:
                 pass
         except AssertionError as e:
             assert str(e) == msg, f"Did not get expected msg: {str(e)}"
+
+
+class TestBenchmark:
+    def test_stats(self):
+        stats = helpers.benchmark(lambda: sum(range(100)), rounds=5, min_round_time=0.001)
+        assert stats.name == "benchmark" and stats.rounds == 5
+        assert stats.min <= stats.median <= stats.p95, f"stats out of order {stats}"
+        assert stats.iterations > 1, "quick functions should be called many times per round"
+
+    def test_recorded(self):
+        def lookup():
+            return {"a": 1}.get("a")
+
+        def test_fast():
+            helpers.benchmark(lookup, rounds=2, min_round_time=0.001)
+            helpers.benchmark(lookup, rounds=2, min_round_time=0.001)
+
+        result = auto._run_test(test_fast)
+        assert result.success, str(result)
+        assert list(result.benchmarks) == ["lookup", "lookup#2"], result.benchmarks
+
+    def test_outside_test(self):
+        assert auto._run_test(lambda: None).benchmarks is None
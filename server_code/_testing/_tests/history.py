@@ -0,0 +1,108 @@
+import os
+import tempfile
+
+from ... import auto, helpers, history
+
+
+class TestFileHistory:
+    def __init__(self):
+        self.path = os.path.join(tempfile.mkdtemp(), "history.json")
+        self.history = history.FileHistory(self.path)
+
+    def test_empty(self):
+        assert self.history.load("app:master") == {}, "new history should be empty"
+
+    def test_round_trip(self):
+        results = {"mod::test_a": {"success": True, "duration": 0.1}}
+        self.history.save("app:master", results)
+        assert self.history.load("app:master") == results, "history did not round trip"
+
+    def test_branches(self):
+        self.history.save("app:master", {"mod::test_a": {"success": True, "duration": 0.1}})
+        self.history.save("app:dev", {"mod::test_a": {"success": False, "duration": 0.1}})
+        master = self.history.load("app:master")
+        assert master["mod::test_a"]["success"], f"branches should be kept apart: {master}"
+
+
+class TestOrdering:
+    def __init__(self):
+        self.previous = {
+            "a": {"success": True, "duration": 0.1},
+            "b": {"success": False, "duration": 2.0},
+            "c": {"success": False, "duration": 0.5},
+        }
+
+    def test_failed(self):
+        assert history.failed(self.previous) == {"b", "c"}
+
+    def test_failed_first(self):
+        ordered = history.failed_first(["a", "b", "c", "d"], self.previous)
+        assert ordered == ["c", "b", "a", "d"], f"quickest failure should be first: {ordered}"
+
+    def test_record(self):
+        results = history.record(self.previous, [auto.TestResult(True, "b", duration=0.3)])
+        assert results["b"] == {"success": True, "duration": 0.3}, results["b"]
+        assert results["c"] == self.previous["c"], "tests that did not run should be kept"
+
+    def test_record_prunes(self):
+        results = history.record(self.previous, [auto.TestResult(True, "a", duration=0.1)], collected={"a", "b"})
+        assert sorted(results) == ["a", "b"], f"tests no longer collected should be dropped: {results}"
+
+
+class TestBenchmarkBaseline:
+    def __init__(self):
+        self.previous = {"mod::test_a": {"success": True, "duration": 0.1, "benchmarks": {"fn": {"median": 1.0}}}}
+
+    def _result(self, median):
+        stats = helpers.BenchmarkStats("fn", 1, 1, median, median, median, 0.0)
+        return auto.TestResult(True, "mod::test_a", benchmarks={"fn": stats})
+
+    def test_regression(self):
+        regressed = history.regressions(self.previous, [self._result(1.5)], threshold=0.2)
+        assert regressed == {("mod::test_a", "fn"): (1.0, 1.5)}, regressed
+
+    def test_within_threshold(self):
+        assert not history.regressions(self.previous, [self._result(1.1)], threshold=0.2)
+
+    def test_keep_baseline(self):
+        results = [self._result(1.5)]
+        regressed = history.regressions(self.previous, results, threshold=0.2)
+        recorded = history.record(self.previous, results, regressed)
+        assert recorded["mod::test_a"]["benchmarks"]["fn"] == {"median": 1.0}, "regressed baseline was replaced"
+
+    def test_creep(self):
+        previous = self.previous
+        for median in [1.15, 1.15**2, 1.15**3]:
+            results = [self._result(median)]
+            regressed = history.regressions(previous, results, threshold=0.2)
+            previous = history.record(previous, results, regressed)
+        assert regressed, "15% slower every run should be flagged against the first baseline"
+
+    def test_improvement(self):
+        recorded = history.record(self.previous, [self._result(0.5)])
+        assert recorded["mod::test_a"]["benchmarks"]["fn"]["median"] == 0.5, "a faster run is the new baseline"
+
+    def test_reset(self):
+        recorded = history.record(self.previous, [self._result(1.5)], reset=True)
+        assert recorded["mod::test_a"]["benchmarks"]["fn"]["median"] == 1.5, "reset should replace the baseline"
+
+    def test_report(self):
+        results = [self._result(1.5)]
+        regressed = history.regressions(self.previous, results, threshold=0.2)
+        report = "\n".join(auto._format_benchmarks(results, regressed))
+        assert "REGRESSION +50%" in report, report
+
+
+class TestShard:
+    def test_balanced(self):
+        previous = {"a": {"duration": 4.0}, "b": {"duration": 3.0}, "c": {"duration": 2.0}, "d": {"duration": 1.0}}
+        shards = history.shard(["a", "b", "c", "d"], previous, 2)
+        assert sorted(shards) == [["a", "d"], ["b", "c"]], shards
+
+    def test_collection_order(self):
+        previous = {"a": {"duration": 1.0}, "b": {"duration": 5.0}}
+        shards = history.shard(["a", "b", "c"], previous, 1)
+        assert shards == [["a", "b", "c"]], shards
+
+    def test_more_shards_than_tests(self):
+        assert history.shard(["a"], {}, 4) == [["a"]]
@@ -0,0 +1,64 @@
+import json
+import os
+import sys
+import tempfile
+import xml.etree.ElementTree as ElementTree
+
+from ... import auto, helpers, reporters
+
+# quick tests of this suite to report on
+SELECT = ["history::TestFileHistory::test_empty", "history::TestOrdering::test_failed"]
+
+
+def _report(reporter, **options) -> str:
+    lines = auto.iter_report(sys.modules[__package__], select=SELECT, history=False, reporter=reporter, **options)
+    return "\n".join(lines)
+
+
+class TestJson:
+    def test_document(self):
+        report = json.loads(_report("json"))
+        assert [test["name"] for test in report["tests"]] == SELECT, report
+        assert report["summary"]["passed"] == 2 and report["summary"]["success"], report["summary"]
+        assert all("duration" in test and "error_type" in test for test in report["tests"]), report
+
+    def test_failure(self):
+        result = auto.TestResult(False, "mod::test_a", ValueError("bad value"), duration=0.5)
+        record = json.loads(reporters.JsonReporter().result(result)[0])
+        assert record["error_type"] == "ValueError" and record["message"] == "bad value", record
+
+
+class TestJUnit:
+    def test_document(self):
+        suites = ElementTree.fromstring(_report("junit"))
+        cases = suites.findall("testsuite/testcase")
+        assert [case.get("name") for case in cases] == ["test_empty", "test_failed"], ElementTree.tostring(suites)
+        assert cases[0].get("classname") == "history.TestFileHistory", cases[0].attrib
+
+    def test_failure(self):
+        reporter = reporters.JUnitReporter()
+        failed = auto.TestResult(False, "mod::test_a", AssertionError(["a < b", "c & d"]))
+        errored = auto.TestResult(False, "mod::test_b", KeyError("missing"))
+        xml = "\n".join(["<testsuite>", *reporter.result(failed), *reporter.result(errored), "</testsuite>"])
+        cases = ElementTree.fromstring(xml).findall("testcase")
+        assert cases[0].find("failure").text == "a < b\nc & d", xml
+        assert cases[1].find("error").get("type") == "KeyError", xml
+
+
+class TestText:
+    def test_unchanged(self):
+        report = _report("text", header="reporters")
+        assert "Collected 2 tests" in report and "2/2 passed" in report and "PASS" in report, report
+
+    def test_unknown(self):
+        with helpers.raises(ValueError):
+            reporters.get_reporter("yaml")
+
+
+@auto.serial
+class TestOutput:
+    def test_file(self):
+        path = os.path.join(tempfile.mkdtemp(), "report.json")
+        report = auto.run(sys.modules[__package__], select=SELECT, history=False, reporter="json", output=path)
+        with open(path) as f:
+            assert f.read().strip() == report, "the file should hold the same report"
@@ -2,17 +2,659 @@ from anvil import app
 import anvil.tables as tables
 import anvil.tables.query as q
 from anvil.tables import app_tables
+import ast
+import asyncio
+import cProfile
+import contextvars
+import io
+import pstats
+import importlib
+import importlib.util
 import inspect as _inspect
+import functools
+import os
+import pickle
+import re
+import sys
+import threading
+from collections import Counter, defaultdict, deque, namedtuple
+from collections.abc import Sequence
+from concurrent.futures import CancelledError, Future, ProcessPoolExecutor, ThreadPoolExecutor, as_completed
 from dataclasses import dataclass
 import textwrap
+import time
+import traceback
+import tracemalloc
+from contextlib import contextmanager, nullcontext
+
+from . import factories as _factories
+from . import fake_tables as _fake_tables
+from . import history as _history
 
 FN_PREFIX = "test_"  # also the method prefix
 CLS_PREFIX = "Test"
+SERIAL_ATTR = "_anvil_testing_serial"
+NON_TRANSACTIONAL_ATTR = "_anvil_testing_non_transactional"
+FIXTURE_ATTR = "_anvil_testing_fixture"
+TIMEOUT_ATTR = "_anvil_testing_timeout"
+PARAMETRIZE_ATTR = "_anvil_testing_parametrize"
+SCOPES = ("function", "class", "module", "session")
 
 
-def _find_tests(parent):
-    """recursivly find all functions/methods within the module that start with the test prefix"""
+class _Current:
+    """State of the running test, ie. where helpers.benchmark records its results
+    Kept in context variables rather than thread locals so async tests sharing a thread each have their own.
+    """
+
+    _benchmarks = contextvars.ContextVar("anvil_testing_benchmarks", default=None)
+
+    @property
+    def benchmarks(self) -> dict | None:
+        return self._benchmarks.get()
+
+    @benchmarks.setter
+    def benchmarks(self, value: dict | None):
+        self._benchmarks.set(value)
+
+
+_current = _Current()
+
+
+def serial(obj):
+    """Mark a test function or test class to opt out of concurrent execution
+    Serial tests wait for the running tests to finish and then run on their own.
+
+    Example:
+        @auto.serial
+        def test_table_count():
+            assert len(app_tables.my_table.search()) == 3
+    """
+    setattr(obj, SERIAL_ATTR, True)
+    return obj
+
+
+def non_transactional(obj):
+    """Mark a test function or test class to not be wrapped in a transaction by isolate='transaction'
+    Use this for tests that open their own transaction, ie. with temp_writes.
+    Rows these tests add with add_row or add_rows are tracked and deleted after the test instead.
+    """
+    setattr(obj, NON_TRANSACTIONAL_ATTR, True)
+    return obj
+
+
+def timeout(seconds: float):
+    """Mark a test function or test class to fail when a test runs for longer than seconds
+    Overrides the timeout given to run.
+
+    Example:
+        @auto.timeout(5)
+        def test_external_api():
+            assert fetch_prices()
+    """
+
+    def mark(obj):
+        setattr(obj, TIMEOUT_ATTR, seconds)
+        return obj
+
+    return mark
+
+
+def parametrize(names, cases, ids=None):
+    """Run a test function or method once for each case, each case is reported as its own test
+    ie. module::test_x[case3] or module::test_x[small] with ids
+    Cases of a test method share one instance of the class, so setup in __init__ is done once for all the cases.
+    Args:
+        names: argument names the case values are passed as, ie. 'a, b' or ['a', 'b']
+        cases: list of values, a tuple of values per case when there are several names.
+            A function that returns the cases, ie. a generator, streams them instead of holding them in memory.
+        ids: list of case ids, or a function of the case that returns its id, defaults to case0, case1, ...
+
+    Example:
+        @auto.parametrize('value, expected', [(1, '1'), (2.5, '2.5'), (None, '')], ids=['int', 'float', 'none'])
+        def test_format(value, expected):
+            assert format_value(value) == expected
+    """
+    names = [name.strip() for name in names.split(",")] if isinstance(names, str) else list(names)
+    if not names or not all(names):
+        raise ValueError(f"parametrize needs argument names, got {names!r}")
+    if not isinstance(cases, Sequence) and not callable(cases):
+        # a one shot iterator can't be read again once collection has counted it
+        cases = list(cases)
+
+    def mark(fn):
+        if hasattr(fn, PARAMETRIZE_ATTR):
+            raise ValueError(f"{fn.__qualname__} is already parametrized, combine the cases into one table")
+        setattr(fn, PARAMETRIZE_ATTR, (names, cases, ids))
+        return fn
+
+    return mark
+
+
+def _marker(test, attr: str, default=None):
+    """Value of the marker on the test, or the class it belongs to"""
+    value = getattr(test, attr, None)
+    if value is not None:
+        return value
+
+    instance = getattr(test, "__self__", None)
+    cls = getattr(test, "cls", type(instance))
+    return getattr(cls, attr, default)
+
+
+def _marked(test, attr: str) -> bool:
+    """Check if the test, or the class it belongs to, has the marker"""
+    return bool(_marker(test, attr, False))
+
+
+def _is_serial(test) -> bool:
+    """Check if the test, or the class it belongs to, has been marked as serial"""
+    return _marked(test, SERIAL_ATTR)
+
+
+def _is_async(test) -> bool:
+    """Check if the test is an async def function or method"""
+    return _inspect.iscoroutinefunction(getattr(test, "__wrapped__", test))
+
+
+def _awaited(call):
+    """Run an async test to completion on an event loop of its own, for when it runs on a thread"""
+
+    @functools.wraps(call)
+    def run(*args, **kwargs):
+        return asyncio.run(call(*args, **kwargs))
+
+    return run
+
+
+def _table_names() -> list:
+    """Names of the app's tables, tests can leave rows behind in any of them"""
+    return [name for name in app_tables if name != _history.HISTORY_TABLE]
+
+
+# rows added by the running test while it is isolated, {id(table): (table name, {id(row): (table, row)})}
+_added_rows = contextvars.ContextVar("anvil_testing_added_rows", default=None)
+_tracking_lock = threading.Lock()
+# table classes whose add_row and add_rows are wrapped, with how many isolated tests are using them
+_tracked_classes = dict()
+
+
+def _tracked(add, many: bool):
+    """Wrap add_row or add_rows of a table class to note the rows added by the isolated test that is running"""
+
+    @functools.wraps(add)
+    def add_tracked(table, *args, **kwargs):
+        result = add(table, *args, **kwargs)
+        tracked = _added_rows.get()
+        if tracked is not None and id(table) in tracked:
+            rows = tracked[id(table)][1]
+            for row in result if many else [result]:
+                rows[id(row)] = (table, row)
+        return result
+
+    return add_tracked
+
+
+@contextmanager
+def _tracking(tables_by_name: dict):
+    """Note the rows added to the tables from this thread, yielding the tracked rows per table
+    Only this test's rows are seen, so tests running alongside it can't be blamed for them or lose them.
+    """
+    classes = {type(table) for table in tables_by_name.values()}
+    with _tracking_lock:
+        for cls in classes:
+            if cls not in _tracked_classes:
+                originals = {name: cls.__dict__.get(name) for name in ("add_row", "add_rows")}
+                for name, many in (("add_row", False), ("add_rows", True)):
+                    if hasattr(cls, name):
+                        setattr(cls, name, _tracked(getattr(cls, name), many))
+                _tracked_classes[cls] = [originals, 0]
+            _tracked_classes[cls][1] += 1
+
+    tracked = {id(table): (name, dict()) for name, table in tables_by_name.items()}
+    token = _added_rows.set(tracked)
+    try:
+        yield tracked
+    finally:
+        _added_rows.reset(token)
+        with _tracking_lock:
+            for cls in classes:
+                _tracked_classes[cls][1] -= 1
+                if _tracked_classes[cls][1] == 0:
+                    originals, _ = _tracked_classes.pop(cls)
+                    for name, original in originals.items():
+                        if original is None:
+                            if name in cls.__dict__:
+                                delattr(cls, name)
+                        else:
+                            setattr(cls, name, original)
+
+
+def _remaining_rows(tracked: dict) -> dict:
+    """The tracked rows that haven't been deleted, per table name"""
+    remaining = dict()
+    for name, rows in tracked.values():
+        for table, row in rows.values():
+            try:
+                exists = table.get_by_id(row.get_id()) is not None
+            except tables.RowDeleted:
+                exists = False
+            if exists:
+                remaining.setdefault(name, []).append(row)
+    return remaining
+
+
+@contextmanager
+def _isolation(test, isolate: str = None):
+    """Undo the rows a test writes, yielding a dict that is filled with the stray rows per table
+    Args:
+        test: collected test
+        isolate: None does nothing, 'transaction' runs the test in a transaction that is aborted
+            Tests marked non_transactional have the rows they add deleted instead.
+    """
+    if isolate is None:
+        yield None
+        return
+
+    stray_rows = dict()
+    if isolate != "transaction":
+        raise ValueError(f"Unknown isolate '{isolate}', expected 'transaction'")
+
+    tables_by_name = {name: app_tables[name] for name in _table_names()}
+    if _marked(test, NON_TRANSACTIONAL_ATTR):
+        with _tracking(tables_by_name) as tracked:
+            try:
+                yield stray_rows
+            finally:
+                from .helpers import _delete_rows
+
+                for name, rows in _remaining_rows(tracked).items():
+                    stray_rows[name] = len(rows)
+                    _delete_rows(rows)
+        return
+
+    with tables.Transaction() as txn, _tracking(tables_by_name) as tracked:
+        try:
+            yield stray_rows
+        finally:
+            stray_rows.update({name: len(rows) for name, rows in _remaining_rows(tracked).items()})
+            # abort the transaction changes
+            txn.abort()
+
+
+def fixture(fn=None, *, scope: str = "function"):
+    """Mark a function as a fixture that tests can request by naming it as an argument
+    Fixtures are created right before the first test that needs them and shared within their scope.
+    Yield the value to run teardown code once the scope is finished.
+    Fixtures are found in the test class, the test module and then the parent packages of the test module.
+    Args:
+        scope: 'function', 'class', 'module' or 'session'
+
+    Example:
+        @auto.fixture(scope="module")
+        def columns():
+            return app_tables.my_table.list_columns()
+
+        @auto.fixture
+        def row():
+            row = app_tables.my_table.add_row(id='test')
+            yield row
+            row.delete()
+
+        def test_row(row, columns):
+            assert set(dict(row)) == {column['name'] for column in columns}
+    """
+    if scope not in SCOPES:
+        raise ValueError(f"Unknown fixture scope '{scope}', expected one of {SCOPES}")
+
+    def decorator(fn):
+        setattr(fn, FIXTURE_ATTR, scope)
+        return fn
+
+    if fn is not None:
+        return decorator(fn)
+    return decorator
+
+
+class _MethodTest:
+    """A test method that only creates its class instance when it is run"""
+
+    def __init__(self, cls, name: str):
+        self.cls = cls
+        self.name = name
+        functools.update_wrapper(self, getattr(cls, name))
+
+    def bind(self):
+        """Create a new class instance to isolate the test and get the test method"""
+        return getattr(self.cls(), self.name)
+
+    def __call__(self, *args, **kwargs):
+        return self.bind()(*args, **kwargs)
+
+
+class _Cases:
+    """The case table of a parametrized test, cases are read from the table as their tests run
+    Tests usually run in collection order, so a streamed table is read once, holding only cases that are run early.
+    """
+
+    def __init__(self, fn, cls=None):
+        self.fn = fn
+        self.cls = cls
+        self.names, self.source, self._ids = getattr(fn, PARAMETRIZE_ATTR)
+        self._lock = threading.Lock()
+        self._instance = None
+        self._iterator = None
+        self._position = 0
+        # collected cases that haven't been read yet and cases read ahead of their test
+        self._pending = set()
+        self._waiting = dict()
+
+    def _iterate(self):
+        return iter(self.source() if callable(self.source) else self.source)
+
+    def ids(self):
+        """Id of each case, reading through the table once"""
+        ids = self._ids
+        for index, case in enumerate(self._iterate()):
+            if ids is None:
+                yield f"case{index}"
+            elif callable(ids):
+                yield str(ids(case))
+            elif index < len(ids):
+                yield str(ids[index])
+            else:
+                raise ValueError(f"{self.fn.__qualname__} has more cases than the {len(ids)} ids given")
+
+    def expect(self, indexes):
+        """The cases that were collected, only these are held when the table is read ahead"""
+        self._pending.update(indexes)
+
+    def _case(self, index: int):
+        if isinstance(self.source, Sequence):
+            return self.source[index]
+
+        with self._lock:
+            if index in self._waiting:
+                return self._waiting.pop(index)
+
+            if self._iterator is None or index < self._position:
+                # the case has been read already, ie. the test is run again, so start the table over
+                self._iterator = self._iterate()
+                self._position = 0
+
+            for case in self._iterator:
+                position = self._position
+                self._position += 1
+                if position == index:
+                    self._pending.discard(index)
+                    return case
+                if position in self._pending:
+                    self._pending.discard(position)
+                    self._waiting[position] = case
+
+        raise IndexError(f"{self.fn.__qualname__} has no case {index}, did the case table change?")
+
+    def arguments(self, index: int) -> dict:
+        """The case as keyword arguments of the test"""
+        case = self._case(index)
+        if len(self.names) == 1:
+            return {self.names[0]: case}
+        if len(case) != len(self.names):
+            raise ValueError(f"case {index} has {len(case)} values for {len(self.names)} names {self.names}")
+        return dict(zip(self.names, case))
+
+    def bind(self):
+        """The test function, or the method of the instance shared by the cases"""
+        if self.cls is None:
+            return self.fn
+        with self._lock:
+            if self._instance is None:
+                self._instance = self.cls()
+        return getattr(self._instance, self.fn.__name__)
+
+
+class _CaseTest:
+    """One case of a parametrized test"""
+
+    def __init__(self, cases: _Cases, index: int, case_id: str):
+        functools.update_wrapper(self, cases.fn)
+        self.cases = cases
+        self.cls = cases.cls
+        self.index = index
+        self.__qualname__ = f"{cases.fn.__qualname__}[{case_id}]"
+
+    def bind(self):
+        """Get the test with the case filled in"""
+        return functools.partial(self.cases.bind(), **self.cases.arguments(self.index))
+
+    def __call__(self, *args, **kwargs):
+        return self.bind()(*args, **kwargs)
+
+
+def _expand(fn, cls=None, selection=None) -> list:
+    """The selected cases of a parametrized test, see parametrize"""
+    if selection is not None and not selection.may_match(_format_test_name(fn)):
+        return []
+
+    cases = _Cases(fn, cls)
     found_tests = list()
+    for index, case_id in enumerate(cases.ids()):
+        test = _CaseTest(cases, index, case_id)
+        if selection is None or selection.matches(_format_test_name(test)):
+            found_tests.append(test)
+    cases.expect(test.index for test in found_tests)
+    return found_tests
+
+
+class _Fixtures:
+    """Create the fixtures requested by tests as they run, sharing and tearing them down by scope"""
+
+    def __init__(self, found_tests=()):
+        self._lock = threading.RLock()
+        # futures of the shared fixture values, so a fixture being created can be waited on
+        self._values = dict()
+        self._teardowns = defaultdict(list)
+
+        # how many tests are left in each class and module, to know when to tear down
+        self._remaining = Counter()
+        for test in found_tests:
+            self.expect(test)
+
+    def expect(self, test):
+        """Count another run of the test, its class and module fixtures are kept until it finishes"""
+        keys = self._scope_keys(test)
+        with self._lock:
+            self._remaining[keys["class"]] += 1
+            self._remaining[keys["module"]] += 1
+
+    @staticmethod
+    def _scope_keys(test) -> dict:
+        """Key that a fixture value is shared by for each scope"""
+        cls = getattr(test, "cls", None)
+        # the cases of a parametrized function share its class scope
+        owner = cls.__qualname__ if cls is not None else test.__qualname__.partition("[")[0]
+        return {
+            "class": ("class", test.__module__, owner),
+            "module": ("module", test.__module__),
+            "session": ("session",),
+        }
+
+    @staticmethod
+    def _arguments(fn) -> list:
+        """Names of the fixtures a test or fixture asks for"""
+        try:
+            parameters = _inspect.signature(fn).parameters.values()
+        except (TypeError, ValueError):
+            return list()
+        return [
+            parameter.name
+            for parameter in parameters
+            if parameter.default is parameter.empty
+            and parameter.kind in (parameter.POSITIONAL_OR_KEYWORD, parameter.KEYWORD_ONLY)
+        ]
+
+    @staticmethod
+    def _lookup(test, name: str):
+        """Find the fixture called name for the test, checking the class, module then parent packages"""
+        cls = getattr(test, "cls", None)
+        if cls is not None:
+            fn = getattr(cls, name, None)
+            if hasattr(fn, FIXTURE_ATTR):
+                return fn, True
+
+        module_name = test.__module__
+        while module_name:
+            fn = getattr(sys.modules.get(module_name), name, None)
+            if hasattr(fn, FIXTURE_ATTR):
+                return fn, False
+            module_name = module_name.rpartition(".")[0]
+
+        raise LookupError(f"fixture '{name}' not found")
+
+    def setup(self, test, call):
+        """Create the fixtures test needs
+        Args:
+            test: collected test
+            call: the function that will be run, a bound method for class tests
+
+        Returns: (kwargs for the test, function scoped teardowns)
+        """
+        names = self._arguments(call)
+        local = dict()
+        teardowns = list()
+        if not names:
+            return local, teardowns
+
+        keys = self._scope_keys(test)
+        # parametrized cases are partials of the test
+        instance = getattr(getattr(call, "func", call), "__self__", None)
+
+        def create(fn, in_class, scope):
+            if in_class:
+                # fixtures in the test class are run as methods of the test's instance
+                fn = fn.__get__(instance, type(instance))
+            value = fn(**{argument: get(argument, scope) for argument in self._arguments(fn)})
+
+            if _inspect.isgenerator(value):
+                generator = value
+                value = next(generator)
+                if scope == "function":
+                    teardowns.append(generator)
+                else:
+                    with self._lock:
+                        self._teardowns[keys[scope]].append(generator)
+            return value
+
+        def get(name, requested_by="function"):
+            fn, in_class = self._lookup(test, name)
+            scope = getattr(fn, FIXTURE_ATTR)
+            if SCOPES.index(scope) < SCOPES.index(requested_by):
+                raise ValueError(
+                    f"{requested_by} scoped fixture can't use the {scope} scoped fixture '{name}'"
+                )
+
+            if scope == "function":
+                if name not in local:
+                    local[name] = create(fn, in_class, scope)
+                return local[name]
+
+            # the first test to need a shared fixture creates it outside of the lock,
+            # only tests waiting for the same fixture wait for it rather than every worker
+            key = (keys[scope], name)
+            with self._lock:
+                future = self._values.get(key)
+                creating = future is None
+                if creating:
+                    future = self._values[key] = Future()
+
+            if creating:
+                try:
+                    future.set_result(create(fn, in_class, scope))
+                except BaseException as e:
+                    # let a later test try again
+                    with self._lock:
+                        self._values.pop(key, None)
+                    future.set_exception(e)
+            return future.result()
+
+        try:
+            return {name: get(name) for name in names}, teardowns
+        except BaseException:
+            self._teardown(teardowns)
+            raise
+
+    @staticmethod
+    def _teardown(generators, raise_errors: bool = True):
+        """Finish fixture generators in the reverse order they were created"""
+        error = None
+        for generator in reversed(generators):
+            try:
+                next(generator)
+            except StopIteration:
+                continue
+            except Exception as e:
+                error = error or e
+            else:
+                error = error or RuntimeError(f"fixture {generator.__name__} yielded more than once")
+        generators.clear()
+
+        if error is not None:
+            if raise_errors:
+                raise error
+            print(f"Error during fixture teardown: {type(error).__name__}: {error}")
+
+    def finish(self, test, teardowns, raise_errors: bool = True):
+        """Tear down after the test, including any class or module fixtures no longer needed"""
+        try:
+            self._teardown(teardowns, raise_errors)
+        finally:
+            keys = self._scope_keys(test)
+            with self._lock:
+                for scope in ("class", "module"):
+                    key = keys[scope]
+                    self._remaining[key] -= 1
+                    if self._remaining[key] <= 0:
+                        self._drop(key)
+
+    def _drop(self, key):
+        for value_key in [value_key for value_key in self._values if value_key[0] == key]:
+            del self._values[value_key]
+        self._teardown(self._teardowns.pop(key, []), raise_errors=False)
+
+    def close(self):
+        """Tear down anything that is left, the session last"""
+        with self._lock:
+            session = ("session",)
+            for key in [key for key in self._teardowns if key != session]:
+                self._drop(key)
+            self._drop(session)
+
+
+_collection_cache = dict()
+_collection_stats = {"hits": 0, "misses": 0}
+CacheInfo = namedtuple("CacheInfo", ["hits", "misses", "currsize"])
+
+
+def collection_cache_info() -> CacheInfo:
+    """Hit and miss counts of the test collection cache"""
+    return CacheInfo(
+        _collection_stats["hits"], _collection_stats["misses"], len(_collection_cache)
+    )
+
+
+def clear_collection_cache():
+    """Forget all discovered tests and reset the cache counts"""
+    _collection_cache.clear()
+    _collection_stats["hits"] = 0
+    _collection_stats["misses"] = 0
+
+
+def _discover(parent) -> list:
+    """Find the names of the submodules, test classes and test functions within parent
+    Returns: list of (kind, name, children)
+        kind is one of 'module', 'class', 'method' or 'function'
+        children is the discovered index of a class, otherwise None
+    """
+    index = list()
 
     for name in dir(parent):
         if not name.startswith("_"):
@@ -20,11 +662,11 @@ def _find_tests(parent):
 
             # Delve into modules in the same path, don't stray into imports.
             if _inspect.ismodule(obj) and obj.__name__.startswith(parent.__name__):
-                found_tests.extend(_find_tests(obj))
+                index.append(("module", name, None))
 
             # Extract test methods from classes
             elif _inspect.isclass(obj) and name.startswith(CLS_PREFIX):
-                found_tests.extend(_find_tests(obj))
+                index.append(("class", name, _discover(obj)))
 
             # grab test methods
             # since parent is not an instance of the class obj is not seen as a method and rather, a function.
@@ -33,21 +675,365 @@ def _find_tests(parent):
                 and _inspect.isfunction(obj)
                 and name.startswith(FN_PREFIX)
             ):
-                # create a new class instance for each test method to isolate the tests
-                class_instance = parent()
-                found_tests.append(getattr(class_instance, name))
+                index.append(("method", name, None))
 
             # grab test functions
             elif _inspect.isfunction(obj) and name.startswith(FN_PREFIX):
-                found_tests.append(obj)
+                index.append(("function", name, None))
+
+    return index
+
+
+def _cache_key(module):
+    """Identify the version of a module, None if we can't tell when it changes"""
+    try:
+        mtime = os.path.getmtime(module.__file__)
+    except (AttributeError, TypeError, OSError):
+        return None
+
+    # importing a submodule adds an attribute without touching the source
+    return id(module), mtime, len(vars(module))
+
+
+def _module_index(module) -> list:
+    """Discover the tests within a module, reusing the last discovery if the module is unchanged"""
+    key = _cache_key(module)
+    if key is None:
+        return _discover(module)
+
+    cached = _collection_cache.get(module.__name__)
+    if cached is not None and cached[0] == key:
+        _collection_stats["hits"] += 1
+        return cached[1]
+
+    _collection_stats["misses"] += 1
+    index = _discover(module)
+    _collection_cache[module.__name__] = (key, index)
+    return index
+
+
+def _resolve(parent, index, selection=None) -> list:
+    """Turn a discovered index back into runnable tests
+    Args:
+        parent: module or class the index was discovered in
+        index: from _discover or _parse_index
+        selection: optional _Selection, unselected modules are skipped and classes are not instantiated
+    """
+    found_tests = list()
+
+    for kind, name, children in index:
+        obj = getattr(parent, name)
+
+        if kind == "module":
+            if selection is None or selection.may_contain(obj.__name__):
+                found_tests.extend(_find_tests(obj, selection))
+
+        elif kind == "class":
+            found_tests.extend(_resolve(obj, children, selection))
+
+        elif hasattr(obj, PARAMETRIZE_ATTR):
+            found_tests.extend(_expand(obj, parent if kind == "method" else None, selection))
+
+        elif kind == "method":
+            if selection is None or selection.matches(_format_test_name(obj)):
+                # each test method gets its own class instance when it is run
+                found_tests.append(_MethodTest(parent, name))
+
+        elif selection is None or selection.matches(_format_test_name(obj)):
+            found_tests.append(obj)
 
     return found_tests
 
 
+def _find_tests(parent, selection=None):
+    """recursivly find all functions/methods within the module that start with the test prefix"""
+    if _inspect.ismodule(parent):
+        index = _module_index(parent)
+    else:
+        index = _discover(parent)
+
+    return _resolve(parent, index, selection)
+
+
+def _is_parametrized(node) -> bool:
+    """Does the decorator list of a parsed function mention parametrize, ie. @auto.parametrize(...)"""
+    return any(
+        (isinstance(part, ast.Name) and part.id == "parametrize")
+        or (isinstance(part, ast.Attribute) and part.attr == "parametrize")
+        for decorator in node.decorator_list
+        for part in ast.walk(decorator)
+    )
+
+
+def _parse_index(body, in_class: bool = False) -> list:
+    """Find the test classes, methods and functions in parsed source, same format as _discover
+    except that children of a parametrized function or method is 'parametrize', its case ids are only known once imported
+    """
+    index = dict()
+
+    for node in body:
+        if isinstance(node, ast.ClassDef) and node.name.startswith(CLS_PREFIX):
+            index[node.name] = ("class", node.name, _parse_index(node.body, True))
+
+        elif isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)) and node.name.startswith(FN_PREFIX):
+            children = "parametrize" if _is_parametrized(node) else None
+            index[node.name] = ("method" if in_class else "function", node.name, children)
+
+    # sorted to match the order of dir()
+    return [index[name] for name in sorted(index)]
+
+
+def _source_index(module_name: str, path: str, package_dir: str = None) -> list:
+    """Discover the tests of a module from its source without importing it
+    Args:
+        module_name: dotted name of the module
+        path: source file of the module, __init__.py for packages
+        package_dir: directory of the package, None for plain modules
+    """
+    try:
+        key = (os.path.getmtime(path), package_dir and os.path.getmtime(package_dir))
+    except OSError:
+        key = None
+
+    cached = _collection_cache.get(("ast", path))
+    if key is not None and cached is not None and cached[0] == key:
+        _collection_stats["hits"] += 1
+        return cached[1]
+
+    _collection_stats["misses"] += 1
+    with open(path) as f:
+        index = _parse_index(ast.parse(f.read(), path).body)
+
+    if package_dir is not None:
+        # submodules and subpackages, ignoring private names like dir() discovery does
+        for name in os.listdir(package_dir):
+            if name.startswith("_"):
+                continue
+            if name.endswith(".py"):
+                index.append(("module", name[:-3], None))
+            elif os.path.isfile(os.path.join(package_dir, name, "__init__.py")):
+                index.append(("module", name, None))
+        index.sort(key=lambda entry: entry[1])
+
+    if key is not None:
+        _collection_cache[("ast", path)] = (key, index)
+    return index
+
+
+def _package_source(test_package):
+    """Find where the source of a module or package lives without importing it
+    Args:
+        test_package: imported module or the dotted module name
+
+    Returns: (module name, source file, package directory or None)
+    """
+    if isinstance(test_package, str):
+        spec = importlib.util.find_spec(test_package)
+        if spec is None or spec.origin is None:
+            raise ModuleNotFoundError(f"No source found for '{test_package}'")
+        locations = spec.submodule_search_locations
+        return spec.name, spec.origin, locations[0] if locations else None
+
+    locations = getattr(test_package, "__path__", None)
+    return test_package.__name__, test_package.__file__, locations[0] if locations else None
+
+
+def _find_tests_static(test_package, selection=None) -> list:
+    """Find tests by parsing the source, only importing modules that contain selected tests
+    Tests that are created dynamically, imported or inherited from another module are not seen.
+    Args:
+        test_package: imported module or the dotted module name
+        selection: optional _Selection of tests to keep
+    """
+    return _find_tests_source(*_package_source(test_package), selection)
+
+
+def _select_index(module_name: str, index: list, selection, qualname: str = "") -> list:
+    """Keep the parts of a source index that contain selected tests, judged by name alone"""
+    selected = list()
+    for kind, name, children in index:
+        if kind == "module":
+            if selection.may_contain(f"{module_name}.{name}"):
+                selected.append((kind, name, children))
+
+        elif kind == "class":
+            children = _select_index(module_name, children, selection, f"{qualname}{name}.")
+            if children:
+                selected.append((kind, name, children))
+
+        elif children == "parametrize":
+            # the keyword is checked against each case once the module is imported
+            if selection.may_match(_format_node_id(module_name, f"{qualname}{name}")):
+                selected.append((kind, name, children))
+
+        elif selection.matches(_format_node_id(module_name, f"{qualname}{name}")):
+            selected.append((kind, name, children))
+
+    return selected
+
+
+def _find_tests_source(module_name: str, path: str, package_dir: str = None, selection=None) -> list:
+    """Import and resolve the tests found in the source of a module and its submodules"""
+    index = _source_index(module_name, path, package_dir)
+    if selection is not None:
+        index = _select_index(module_name, index, selection)
+
+    found_tests = list()
+    module = None
+    for entry in index:
+        kind, name, _ = entry
+        if kind == "module":
+            sub_dir = os.path.join(package_dir, name)
+            if os.path.isdir(sub_dir):
+                sub_path = os.path.join(sub_dir, "__init__.py")
+            else:
+                sub_path, sub_dir = os.path.join(package_dir, f"{name}.py"), None
+            found_tests.extend(
+                _find_tests_source(f"{module_name}.{name}", sub_path, sub_dir, selection)
+            )
+
+        else:
+            # only import modules that have tests
+            if module is None:
+                module = importlib.import_module(module_name)
+            found_tests.extend(_resolve(module, [entry], selection))
+
+    return found_tests
+
+
+def _keyword_matcher(expression: str):
+    """Compile a pytest style keyword expression, ie. 'update and not missing'
+    Each word is a case insensitive substring match against the test name.
+    Supports and, or, not and parentheses.
+
+    Returns: function(test_name) -> bool
+    """
+    tokens = re.findall(r"\(|\)|[^\s()]+", expression)
+    position = 0
+
+    def peek():
+        return tokens[position] if position < len(tokens) else None
+
+    def take():
+        nonlocal position
+        token = peek()
+        if token is None:
+            raise ValueError(f"Unexpected end of keyword expression: '{expression}'")
+        position += 1
+        return token
+
+    def parse_or():
+        terms = [parse_and()]
+        while peek() == "or":
+            take()
+            terms.append(parse_and())
+        return lambda name: any(term(name) for term in terms)
+
+    def parse_and():
+        terms = [parse_not()]
+        while peek() == "and":
+            take()
+            terms.append(parse_not())
+        return lambda name: all(term(name) for term in terms)
+
+    def parse_not():
+        if peek() == "not":
+            take()
+            term = parse_not()
+            return lambda name: not term(name)
+        return parse_atom()
+
+    def parse_atom():
+        token = take()
+        if token == "(":
+            term = parse_or()
+            if take() != ")":
+                raise ValueError(f"Missing ')' in keyword expression: '{expression}'")
+            return term
+        if token in {")", "and", "or"}:
+            raise ValueError(f"Unexpected '{token}' in keyword expression: '{expression}'")
+        word = token.lower()
+        return lambda name: word in name.lower()
+
+    matcher = parse_or()
+    if peek() is not None:
+        raise ValueError(f"Unexpected '{peek()}' in keyword expression: '{expression}'")
+    return matcher
+
+
+@dataclass
+class _Selection:
+    """Tests chosen by node id, ie. 'module/path::Class::test', and/or a keyword expression"""
+
+    select: list | None = None
+    keyword: str | None = None
+
+    def __post_init__(self):
+        if isinstance(self.select, str):
+            self.select = [self.select]
+        self._keyword = _keyword_matcher(self.keyword) if self.keyword else None
+
+    def matches(self, test_name: str) -> bool:
+        """Is the test selected, selecting a parametrized test selects all of its cases"""
+        if self.select and not any(
+            test_name == node or test_name.startswith((f"{node}::", f"{node}/", f"{node}["))
+            for node in self.select
+        ):
+            return False
+        return self._keyword is None or self._keyword(test_name)
+
+    def may_match(self, test_name: str) -> bool:
+        """Could the test or one of its parametrized cases be selected, the keyword is checked against each case"""
+        if not self.select:
+            return True
+        return any(
+            test_name == node
+            or test_name.startswith((f"{node}::", f"{node}/", f"{node}["))
+            or node.startswith(f"{test_name}[")
+            for node in self.select
+        )
+
+    def may_contain(self, module_name: str) -> bool:
+        """Could the module hold selected tests, decided without importing it"""
+        if not self.select:
+            return True
+        module = _format_node_id(module_name, "").rstrip(":")
+        return any(
+            module == node
+            or module.startswith(f"{node}/")
+            or node.startswith((f"{module}::", f"{module}/"))
+            for node in self.select
+        )
+
+
+def _collect(test_package, discovery: str = "import", select: list = None, keyword: str = None) -> list:
+    """Collect the tests of the package
+    Args:
+        test_package: module where the tests reside, or its dotted name for ast discovery
+        discovery: 'import' walks the imported modules, 'ast' parses the source and only imports modules with tests
+        select: optional list of test names to run, ie. 'module/path::Class::test', 'module/path' or 'module/path::Class'
+        keyword: optional expression matched against test names, ie. 'update and not missing'
+    """
+    selection = _Selection(select, keyword) if select or keyword else None
+
+    if discovery == "ast":
+        return _find_tests_static(test_package, selection)
+    elif discovery == "import":
+        return _find_tests(test_package, selection)
+    raise ValueError(f"Unknown discovery '{discovery}', expected 'import' or 'ast'")
+
+
+def _format_node_id(module_name: str, qualname: str, test_module_name="tests"):
+    """Build the descriptive test name from the module and qualified name"""
+    module = module_name.split(f"{test_module_name}.")[-1]
+    # case ids of parametrized tests are kept as they are
+    qualname, bracket, case_id = qualname.partition("[")
+    return f"{module.replace('.', '/')}::{qualname.replace('.', '::')}{bracket}{case_id}"
+
+
 def _format_test_name(fn, test_module_name="tests"):
     """Get a descriptive name of the function that explains where it lives"""
-    module = fn.__module__.split(f"{test_module_name}.")[-1]
-    return f"{module.replace('.', '/')}::{fn.__qualname__.replace('.', '::')}"
+    return _format_node_id(fn.__module__, fn.__qualname__, test_module_name)
 
 
 @dataclass
@@ -55,6 +1041,13 @@ class TestResult:
     success: bool
     test_name: str
     error: AssertionError | None = None
+    duration: float = 0.0
+    cpu_time: float = 0.0
+    stray_rows: dict | None = None
+    benchmarks: dict | None = None
+    profile: pstats.Stats | None = None
+    memory: dict | None = None
+    timed_out: bool = False
 
     _indent = 2
     _success_leader = "Pass: "
@@ -69,6 +1062,43 @@ class TestResult:
     _error_indent = (len(_failure_leader) + _indent) * " "
     _default_msg = "Sorry, no info given."
 
+    @property
+    def error_type(self) -> str | None:
+        """Name of the exception the test failed with"""
+        return None if self.error is None else type(self.error).__name__
+
+    @property
+    def message(self) -> str:
+        """The failure message, assertion messages given as a list, set or dict are put on separate lines"""
+        if self.success:
+            return ""
+
+        if self.error is None:
+            return self._default_msg
+
+        if isinstance(self.error, AssertionError):
+            error_arg = self.error.args
+            if error_arg:
+                # drill down if possible
+                error_arg = error_arg[0]
+
+            if not error_arg:
+                return self._default_msg
+
+            elif isinstance(error_arg, str):
+                return str(self.error)
+
+            elif isinstance(error_arg, list) or isinstance(error_arg, set):
+                return "\n".join(error_arg)
+
+            elif isinstance(error_arg, dict):
+                return "\n".join([f"{key}: {value}" for key, value in error_arg])
+
+            # Not sure how to process...
+            return str(error_arg)
+
+        return str(self.error)
+
     def __str__(self):
         """Convert the test result into a string for the report"""
         if self.success:
@@ -77,36 +1107,13 @@ class TestResult:
             )
             
         else:
-            if self.error is None:
-                error = self._default_msg
-
-            elif isinstance(self.error, AssertionError):
-                error_arg = self.error.args
-                if error_arg:
-                    # drill down if possible
-                    error_arg = error_arg[0]
-
-                if not error_arg:
-                    error = self._default_msg
+            if self.error is None or isinstance(self.error, AssertionError):
+                error = self.message
 
-                elif isinstance(error_arg, str):
-                    error = str(self.error)
-
-                elif isinstance(error_arg, list) or isinstance(error_arg, set):
-                    error = "\n".join(error_arg)
-
-                elif isinstance(error_arg, dict):
-                    error = "\n".join([f"{key}: {value}" for key, value in error_arg])
-
-                else:
-                    # Not sure how to process...
-                    error = str(error_arg)
-                    
             elif isinstance(self.error, Exception):
                 # there was an error running the test
-                error = (
-                    f"Error during test: {type(self.error).__name__}: {str(self.error)}"
-                )
+                error = f"Error during test: {self.error_type}: {self.message}"
+
             else:
                 error = (
                     f"Missed how to handle this error: {type(self.error)}{self.error}"
@@ -129,32 +1136,546 @@ class TestResult:
             return self.__add__(other)
 
 
-def _run_test(test) -> TestResult:
-    """Run a single test"""
+@contextmanager
+def _trace_memory(enabled: bool, threshold: int):
+    """Trace the memory allocated within the block
+    Yields a dict that is filled with the peak and retained bytes, and the sites holding the most memory
+    when the peak reaches threshold.  Add to 'iterations' the retained bytes after each repeat of a test.
+    """
+    if not enabled:
+        yield None
+        return
+
+    started = not tracemalloc.is_tracing()
+    if started:
+        tracemalloc.start()
+    tracemalloc.clear_traces()
+    tracemalloc.reset_peak()
+    memory = {"iterations": list(), "sites": list()}
+    try:
+        yield memory
+    finally:
+        memory["retained"], memory["peak"] = tracemalloc.get_traced_memory()
+        if memory["peak"] >= threshold:
+            top = tracemalloc.take_snapshot().statistics("lineno")[:5]
+            memory["sites"] = [(str(stat.traceback), stat.size, stat.count) for stat in top]
+        if started:
+            tracemalloc.stop()
+
+
+def _leaking(memory: dict | None) -> bool:
+    """Retained memory grew after every repeat of the test"""
+    iterations = (memory or {}).get("iterations", [])
+    return len(iterations) > 1 and all(b > a for a, b in zip(iterations, iterations[1:]))
+
+
+def _run_test(
+    test,
+    fixtures=None,
+    isolate: str = None,
+    profile: bool = False,
+    memory: bool = False,
+    memory_threshold: int = 1_000_000,
+    leak_check: int = 0,
+    factory: _factories.Factory = None,
+) -> TestResult:
+    """Run a single test and record how long it took
+    Args:
+        test: collected test
+        fixtures: _Fixtures shared by the run, otherwise fixtures only live for this test
+        isolate: 'transaction' to undo the rows the test writes, see _isolation
+        profile: True to run the test under cProfile, fixtures are not profiled
+        memory: True to trace the memory the test allocates with tracemalloc, fixtures are not traced
+        memory_threshold: peak bytes above which the top allocation sites are kept
+        leak_check: call the test this many times, recording the retained memory after each call
+        factory: factories.Factory of the run, the test gets a factory seeded from it and the test name
+    """
     test_name = _format_test_name(test, "tests")
+    own_fixtures = fixtures is None
+    if own_fixtures:
+        fixtures = _Fixtures([test])
 
+    # thread_time so concurrent tests don't count each others cpu time
+    start = time.perf_counter()
+    cpu_start = time.thread_time()
+    teardowns = list()
+    stray_rows = None
+    traced = None
+    profiler = cProfile.Profile() if profile else None
+    # tests can run tests, ie. auto's own tests, so put back the outer test's state afterwards
+    outer_benchmarks = getattr(_current, "benchmarks", None)
+    _current.benchmarks = benchmarks = dict()
     try:
-        # Run the test
-        test()
-        return TestResult(True, test_name)
+        # values from factories are seeded by the test name so the test can be rerun with the same data
+        with _factories.for_test(test_name, factory):
+            try:
+                # Run the test, fixtures are created outside of the isolation so they can be shared
+                call = test.bind() if isinstance(test, (_MethodTest, _CaseTest)) else test
+                kwargs, teardowns = fixtures.setup(test, call)
+                if _is_async(test):
+                    call = _awaited(call)
+                with _isolation(test, isolate) as stray_rows, _trace_memory(
+                    memory or leak_check > 0, memory_threshold
+                ) as traced:
+                    for _ in range(max(1, leak_check)):
+                        if profiler is None:
+                            call(**kwargs)
+                        else:
+                            profiler.runcall(call, **kwargs)
+                        if leak_check:
+                            traced["iterations"].append(tracemalloc.get_traced_memory()[0])
+            except BaseException:
+                # the test failure is more interesting than a teardown failure
+                fixtures.finish(test, teardowns, raise_errors=False)
+                raise
+            fixtures.finish(test, teardowns)
+            result = TestResult(True, test_name)
 
     # capture the assertion error from our test
     except AssertionError as e:
-        return TestResult(False, test_name, e)
+        result = TestResult(False, test_name, e)
 
     # capture a run error to aid in debugging
     # otherwise we just get the standard anvil runtime exception error.
     except Exception as e:
-        return TestResult(False, test_name, e)
+        result = TestResult(False, test_name, e)
 
+    finally:
+        _current.benchmarks = outer_benchmarks
+        if own_fixtures:
+            fixtures.close()
+
+    result.duration = time.perf_counter() - start
+    result.cpu_time = time.thread_time() - cpu_start
+    result.stray_rows = stray_rows
+    result.benchmarks = benchmarks or None
+    if profiler is not None:
+        result.profile = pstats.Stats(profiler)
+    result.memory = traced
+    return result
 
-def run(test_package, quiet: bool=True, header: str=None) -> str:
-    """Run the test suite
+
+def _run_timed(test, timeout: float = None, **run_options) -> TestResult:
+    """Run a single test, giving up on it when it runs longer than its timeout
+    The test runs on a watchdog thread that is left behind if it times out, python can't stop a thread.
     Args:
-        test_package: module where the tests reside
-        quiet: True will only display failed tests, False will include passing tests in results
-        header: Something to display at the top to help with identification defaults to Anvil Testing
+        test: collected test
+        timeout: seconds, used when the test is not marked with its own timeout
+        run_options: passed on to _run_test
+    """
+    timeout = _marker(test, TIMEOUT_ATTR, timeout)
+    if not timeout:
+        return _run_test(test, **run_options)
+
+    finished = list()
+    thread = threading.Thread(
+        target=lambda: finished.append(_run_test(test, **run_options)),
+        name=f"anvil_testing {_format_test_name(test)}",
+        daemon=True,
+    )
+    start = time.perf_counter()
+    thread.start()
+    thread.join(timeout)
+    if finished:
+        return finished[0]
+
+    # where the test is stuck
+    elapsed = time.perf_counter() - start
+    frame = sys._current_frames().get(thread.ident)
+    if frame is None:
+        stack = "test finished while timing out\n"
+    else:
+        frames = [summary for summary in traceback.extract_stack(frame) if summary.filename != threading.__file__]
+        stack = "".join(traceback.format_list(frames))
+    error = TimeoutError(f"timed out after {elapsed:.3f}s (timeout={timeout}s), stack at timeout:\n{stack}")
+    return TestResult(False, _format_test_name(test, "tests"), error, duration=elapsed, timed_out=True)
+
+
+def _coroutine_stack(coroutine) -> str:
+    """Where a suspended coroutine is waiting, following the coroutines it awaits"""
+    frames = list()
+    while getattr(coroutine, "cr_frame", None) is not None:
+        frames.append((coroutine.cr_frame, coroutine.cr_frame.f_lineno))
+        coroutine = coroutine.cr_await
+    asyncio_dir = os.path.dirname(asyncio.__file__)
+    summaries = [
+        summary for summary in traceback.StackSummary.extract(frames) if not summary.filename.startswith(asyncio_dir)
+    ]
+    return "".join(traceback.format_list(summaries))
+
+
+async def _run_async(test, fixtures=None, timeout: float = None, factory: _factories.Factory = None) -> TestResult:
+    """Run an async test on the running event loop alongside other async tests, see _run_test
+    While the test awaits, other tests run on the loop, so its cpu time includes theirs.
+    Args:
+        test: collected async test
+        fixtures: _Fixtures shared by the run, otherwise fixtures only live for this test
+        timeout: seconds, used when the test is not marked with its own timeout.  The test is cancelled when it runs over.
+        factory: factories.Factory of the run, the test gets a factory seeded from it and the test name
+    """
+    test_name = _format_test_name(test, "tests")
+    timeout = _marker(test, TIMEOUT_ATTR, timeout)
+    own_fixtures = fixtures is None
+    if own_fixtures:
+        fixtures = _Fixtures([test])
+
+    start = time.perf_counter()
+    cpu_start = time.thread_time()
+    teardowns = list()
+    timed_out = False
+    # each test runs in a task of its own, so this doesn't touch the other tests on the loop
+    _current.benchmarks = benchmarks = dict()
+    try:
+        with _factories.for_test(test_name, factory):
+            try:
+                call = test.bind() if isinstance(test, (_MethodTest, _CaseTest)) else test
+                kwargs, teardowns = fixtures.setup(test, call)
+                task = asyncio.ensure_future(call(**kwargs))
+                done, _ = await asyncio.wait({task}, timeout=timeout or None)
+                if not done:
+                    timed_out = True
+                    stack = _coroutine_stack(task.get_coro())
+                    task.cancel()
+                    raise TimeoutError(
+                        f"timed out after {time.perf_counter() - start:.3f}s (timeout={timeout}s), "
+                        f"stack at timeout:\n{stack}"
+                    )
+                task.result()
+            except BaseException:
+                fixtures.finish(test, teardowns, raise_errors=False)
+                raise
+            fixtures.finish(test, teardowns)
+            result = TestResult(True, test_name)
+
+    except AssertionError as e:
+        result = TestResult(False, test_name, e)
+
+    except Exception as e:
+        result = TestResult(False, test_name, e)
+
+    finally:
+        if own_fixtures:
+            fixtures.close()
+
+    result.duration = time.perf_counter() - start
+    result.cpu_time = time.thread_time() - cpu_start
+    result.benchmarks = benchmarks or None
+    result.timed_out = timed_out
+    return result
+
+
+class _AsyncRunner:
+    """An event loop on a thread of its own that runs async tests concurrently, upto limit at a time
+    Args:
+        limit: most async tests running at once
     """
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self._semaphore = None
+        self._tasks = set()
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name="anvil_testing async", daemon=True)
+        self._thread.start()
+
+    def submit(self, test, **run_options) -> Future:
+        """Start running the test once there is room, see _run_async
+        Like a thread pool, cancelling the future only stops a test that hasn't started.
+        """
+        future = Future()
+
+        async def run():
+            try:
+                if self._semaphore is None:
+                    self._semaphore = asyncio.Semaphore(self.limit)
+                async with self._semaphore:
+                    if future.set_running_or_notify_cancel():
+                        future.set_result(await _run_async(test, **run_options))
+            except BaseException as e:
+                # cancelled when the run is closed early
+                if not future.cancel() and not future.done():
+                    future.set_exception(e)
+
+        def start():
+            task = self._loop.create_task(run())
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+        self._loop.call_soon_threadsafe(start)
+        return future
+
+    async def _cancel(self):
+        for task in list(self._tasks):
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    def close(self):
+        """Cancel anything still running and stop the loop"""
+        asyncio.run_coroutine_threadsafe(self._cancel(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop.close()
+
+
+def _format_durations(test_results, durations: int) -> list:
+    """Report the slowest tests, time spent per module and a histogram of test durations
+    Args:
+        test_results: list of TestResult
+        durations: number of slowest tests to show, 0 shows all of them
+    """
+    log = list()
+    slowest = sorted(test_results, key=lambda result: result.duration, reverse=True)
+    if durations:
+        slowest = slowest[:durations]
+
+    title = f" slowest {len(slowest)} durations "
+    log.append(f"\n{title:=^50s}")
+    for result in slowest:
+        log.append(
+            f"{result.duration:8.3f}s wall {result.cpu_time:8.3f}s cpu  {result.test_name}"
+        )
+
+    # per module totals in collection order
+    modules = dict()
+    for result in test_results:
+        module = result.test_name.split("::")[0]
+        modules[module] = modules.get(module, 0.0) + result.duration
+
+    title = " module durations "
+    log.append(f"\n{title:=^50s}")
+    for module, duration in modules.items():
+        log.append(f"{duration:8.3f}s  {module}")
+
+    # bucket the durations to see where the time goes
+    buckets = [(0.01, "< 10ms"), (0.1, "< 100ms"), (1.0, "< 1s"), (10.0, "< 10s")]
+    counts = [0] * (len(buckets) + 1)
+    for result in test_results:
+        for i, (limit, _) in enumerate(buckets):
+            if result.duration < limit:
+                counts[i] += 1
+                break
+        else:
+            counts[-1] += 1
+
+    title = " duration histogram "
+    log.append(f"\n{title:=^50s}")
+    labels = [label for _, label in buckets] + [">= 10s"]
+    scale = max(1, max(counts) / 30)
+    for label, count in zip(labels, counts):
+        log.append(f"{label:>8s} {count:5d} {'#' * round(count / scale)}".rstrip())
+
+    return log
+
+
+def _format_stray_rows(test_results) -> list:
+    """Report the tests that would have left rows behind without isolation"""
+    log = list()
+    stray = [result for result in test_results if result.stray_rows]
+    if not stray:
+        return log
+
+    title = f" {len(stray)} tests left stray rows "
+    log.append(f"\n{title:=^50s}")
+    for result in stray:
+        counts = ", ".join(f"{name}: {count}" for name, count in result.stray_rows.items())
+        log.append(f"{sum(result.stray_rows.values()):5d} rows  {result.test_name} ({counts})")
+    return log
+
+
+def _percentile(values, percent: float) -> float:
+    """Nearest rank percentile of the values, percent between 0 and 100"""
+    ordered = sorted(values)
+    rank = max(0, -(-len(ordered) * percent // 100) - 1)
+    return ordered[int(rank)]
+
+
+def _format_seconds(seconds: float) -> str:
+    """Short human readable time, ie. 12.3us or 4.56ms"""
+    for unit, scale in (("s", 1), ("ms", 1e-3), ("us", 1e-6)):
+        if seconds >= scale:
+            return f"{seconds / scale:.3g}{unit}"
+    return f"{seconds / 1e-9:.3g}ns"
+
+
+def _format_benchmarks(test_results, regressed: dict) -> list:
+    """Report the benchmarks run by the tests, flagging those slower than their baseline
+    Args:
+        test_results: list of TestResult
+        regressed: from history.regressions
+    """
+    log = list()
+    benchmarked = [result for result in test_results if result.benchmarks]
+    if not benchmarked:
+        return log
+
+    log.append(f"\n{' benchmarks ':=^50s}")
+    for result in benchmarked:
+        for name, stats in result.benchmarks.items():
+            line = (
+                f"median {_format_seconds(stats.median):>7s} min {_format_seconds(stats.min):>7s} "
+                f"p95 {_format_seconds(stats.p95):>7s} stdev {_format_seconds(stats.stdev):>7s}  "
+                f"{result.test_name}::{name}"
+            )
+            if (result.test_name, name) in regressed:
+                baseline, median = regressed[(result.test_name, name)]
+                line += f"  REGRESSION {median / baseline - 1:+.0%} vs {_format_seconds(baseline)}"
+            log.append(line)
+    return log
+
+
+def _format_stats(stats: pstats.Stats, top: int) -> list:
+    """The top functions by cumulative time as report lines"""
+    stream = io.StringIO()
+    stats.stream = stream
+    stats.sort_stats("cumulative").print_stats(top)
+    return [line for line in stream.getvalue().splitlines() if line.strip()]
+
+
+def _format_profile(test_results, top: int, slowest: int = 3) -> list:
+    """Report the functions that took the most time across the run and within the slowest tests
+    Args:
+        test_results: list of TestResult
+        top: number of functions to list
+        slowest: number of the slowest tests to break down
+    """
+    log = list()
+    profiled = [result for result in test_results if result.profile is not None]
+    if not profiled:
+        return log
+
+    merged = pstats.Stats()
+    merged.add(*[result.profile for result in profiled])
+    title = f" top {top} cumulative time "
+    log.append(f"\n{title:=^50s}")
+    log.extend(_format_stats(merged, top))
+
+    for result in sorted(profiled, key=lambda result: result.duration, reverse=True)[:slowest]:
+        log.append(f"\n{result.duration:.3f}s {result.test_name}")
+        log.extend(_format_stats(result.profile, top))
+    return log
+
+
+def _format_bytes(n_bytes: int) -> str:
+    """Short human readable size, ie. 1.5 MiB"""
+    for unit in ("B", "KiB", "MiB"):
+        if abs(n_bytes) < 1024:
+            return f"{n_bytes:.4g} {unit}"
+        n_bytes /= 1024
+    return f"{n_bytes:.4g} GiB"
+
+
+def _format_memory(test_results, threshold: int) -> list:
+    """Report the tests with a peak above threshold, where their memory went, and the tests that leak"""
+    log = list()
+    traced = [result for result in test_results if result.memory is not None]
+    heavy = [result for result in traced if result.memory["peak"] >= threshold]
+    heavy.sort(key=lambda result: result.memory["peak"], reverse=True)
+    if heavy:
+        title = f" {len(heavy)} tests peaked over {_format_bytes(threshold)} "
+        log.append(f"\n{title:=^50s}")
+        for result in heavy:
+            peak, retained = result.memory["peak"], result.memory["retained"]
+            log.append(f"peak {_format_bytes(peak):>10s} retained {_format_bytes(retained):>10s}  {result.test_name}")
+            for site, size, count in result.memory["sites"]:
+                log.append(f"    {_format_bytes(size):>10s} in {count} blocks  {site}")
+
+    leaking = [result for result in traced if _leaking(result.memory)]
+    if leaking:
+        title = f" {len(leaking)} tests leaking "
+        log.append(f"\n{title:=^50s}")
+        for result in leaking:
+            growth = " -> ".join(_format_bytes(n_bytes) for n_bytes in result.memory["iterations"])
+            log.append(f"{result.test_name}  retained {growth}")
+    return log
+
+
+def _iter_tests(found_tests, workers: int = 1, maxfail: int = 0, async_workers: int = 1, **run_options):
+    """Run the collected tests, yielding each result in collection order as soon as it is ready
+    Args:
+        found_tests: list of tests from _find_tests
+        workers: number of threads to run tests on, 1 runs the tests one after another
+        maxfail: stop starting new tests after this many failures, 0 runs everything
+        async_workers: number of async tests to run at once on an event loop, 1 runs them like any other test
+        run_options: passed on to _run_timed, ie. timeout, fixtures and isolate
+    """
+    lock = threading.Lock()
+    stop = threading.Event()
+    submitted = list()
+    failures = 0
+
+    def count(result):
+        """Keep track of failures, cancelling tests that haven't started once we hit maxfail"""
+        nonlocal failures
+        if result.success:
+            return
+        with lock:
+            failures += 1
+            if maxfail and failures >= maxfail and not stop.is_set():
+                stop.set()
+                for future in list(submitted):
+                    future.cancel()
+
+    def counted(future):
+        if not future.cancelled():
+            count(future.result())
+
+    def finished(future):
+        """The result of the future, nothing if it was cancelled"""
+        try:
+            yield future.result()
+        except CancelledError:
+            pass
+
+    executor = ThreadPoolExecutor(max_workers=workers) if workers > 1 else None
+    runner = _AsyncRunner(async_workers) if async_workers > 1 else None
+    async_options = {name: run_options.get(name) for name in ("fixtures", "timeout", "factory")}
+    pending = deque()
+    try:
+        for test in found_tests:
+            if stop.is_set():
+                break
+
+            if runner is not None and _is_async(test) and not _is_serial(test):
+                future = runner.submit(test, **async_options)
+            elif executor is not None and not _is_serial(test):
+                future = executor.submit(_run_timed, test, **run_options)
+            else:
+                future = None
+
+            if future is None:
+                # serial tests, or any test when there is no pool, wait for the running tests to finish
+                while pending:
+                    yield from finished(pending.popleft())
+                if stop.is_set():
+                    break
+                result = _run_timed(test, **run_options)
+                count(result)
+                yield result
+
+            else:
+                submitted.append(future)
+                future.add_done_callback(counted)
+                if stop.is_set():
+                    future.cancel()
+                pending.append(future)
+
+                # pass along anything that has already finished
+                while pending and pending[0].done():
+                    yield from finished(pending.popleft())
+
+        while pending:
+            yield from finished(pending.popleft())
+
+    finally:
+        # don't start tests nobody is waiting for if we are closed early
+        if executor is not None:
+            executor.shutdown(wait=True, cancel_futures=True)
+        if runner is not None:
+            runner.close()
+
+
+def _format_header(header: str = None) -> list:
+    """Header lines identifying the test run"""
     log = list()
 
     # Construct header
@@ -166,30 +1687,505 @@ def run(test_package, quiet: bool=True, header: str=None) -> str:
     # App identification and branch under test
     app_info = f" {app.id}:{app.branch} "
     log.append(f"{app_info:=^50s}")
+    return log
+
+
+def _make_fake_tables(test_package, fake_tables):
+    """The FakeAppTables for a run, None to use the real tables
+    Args:
+        fake_tables: True for the schema of the app the tests belong to, an app's module, directory or anvil.yaml
+            path, or a FakeAppTables
+    """
+    if isinstance(fake_tables, _fake_tables.FakeAppTables):
+        return fake_tables
+    if not fake_tables:
+        return None
+
+    from .helpers import load_db_schema
+
+    if fake_tables is True:
+        fake_tables = importlib.import_module(test_package) if isinstance(test_package, str) else test_package
+    return _fake_tables.FakeAppTables(load_db_schema(fake_tables))
+
+
+class _Session:
+    """The collected tests and options for one run of the suite
+    Iterate to run the tests, results are yielded in collection order.
+    """
+
+    def __init__(
+        self,
+        test_package,
+        workers: int = 1,
+        discovery: str = "import",
+        select: list = None,
+        keyword: str = None,
+        history=None,
+        last_failed: bool = False,
+        failed_first: bool = False,
+        maxfail: int = 0,
+        exitfirst: bool = False,
+        isolate: str = None,
+        fake_tables=None,
+        benchmark_threshold: float = 0.2,
+        reset_benchmarks: bool = False,
+        profile=False,
+        memory: bool = False,
+        memory_threshold: int = 1_000_000,
+        leak_check: int = 0,
+        timeout: float = None,
+        shards: int = 0,
+        shard_executor=None,
+        seed=None,
+        async_workers: int = 1,
+    ):
+        self.test_package = test_package
+        self.workers = workers
+        self.async_workers = async_workers
+        self.maxfail = 1 if exitfirst else maxfail
+        self.isolate = isolate
+        self.fake_tables = _make_fake_tables(test_package, fake_tables)
+        self.benchmark_threshold = benchmark_threshold
+        self.reset_benchmarks = reset_benchmarks
+        self.regressions = dict()
+        self.profile = 20 if profile is True else profile
+        self.memory = memory or leak_check > 0
+        self.memory_threshold = memory_threshold
+        self.leak_check = leak_check
+        self.timeout = timeout
+        self.factory = _factories.Factory(seed)
+        self.notes = [f"Random seed {self.factory.seed}"]
+        if (self.profile or self.memory) and workers > 1:
+            # a profile only sees its own thread and tracemalloc would count every thread's allocations
+            self.workers = 1
+            self.notes.append("Profiling and memory tracing run the tests one at a time")
+        if (self.profile or self.memory or isolate) and async_workers > 1:
+            # these follow one test on its thread, async tests sharing the loop would be counted together
+            self.async_workers = 1
+            self.notes.append("Async tests run one at a time with profiling, memory tracing or isolation")
+
+        # each shard runs a session of its own with the same options, history is kept here
+        self.shards = shards
+        self.shard_executor = shard_executor
+        self.shard_options = dict(
+            workers=self.workers,
+            discovery=discovery,
+            maxfail=self.maxfail,
+            isolate=isolate,
+            fake_tables=fake_tables,
+            profile=profile,
+            memory=memory,
+            memory_threshold=memory_threshold,
+            leak_check=leak_check,
+            timeout=timeout,
+            seed=self.factory.seed,
+            async_workers=self.async_workers,
+        )
+
+        # previous results for this app and branch
+        self.app_key = f"{app.id}:{app.branch}"
+        self.history = _history.default_backend() if history is None else history
+        self.previous = self.history.load(self.app_key) if self.history else dict()
+
+        start = time.perf_counter()
+        failures = _history.failed(self.previous) if last_failed else set()
+        if failures and not select:
+            # collect only the failures so nothing else is imported or created
+            found_tests = _collect(test_package, discovery, sorted(failures), keyword)
+        else:
+            found_tests = _collect(test_package, discovery, select, keyword)
+
+        if last_failed:
+            if failures:
+                found_tests = [test for test in found_tests if _format_test_name(test) in failures]
+            if found_tests and failures:
+                self.notes.append(f"Running {len(found_tests)} previously failed tests")
+            elif failures:
+                # the failures were renamed or deleted since, don't pass by running nothing
+                failures = set()
+                found_tests = _collect(test_package, discovery, select, keyword)
+                self.notes.append("None of the previously failed tests were found, running all tests")
+            else:
+                self.notes.append("No previously failed tests, running all tests")
+
+        # history of tests that a full run no longer collects is dropped
+        self.collected = None
+        if not select and not keyword and not failures:
+            self.collected = {_format_test_name(test) for test in found_tests}
+
+        if failed_first:
+            found_tests = _history.failed_first(found_tests, self.previous, _format_test_name)
+
+        self.found_tests = found_tests
+        self.collection_time = time.perf_counter() - start
+
+    def __len__(self):
+        return len(self.found_tests)
+
+    def _iter_local(self):
+        fixtures = _Fixtures(self.found_tests)
+        installed = nullcontext() if self.fake_tables is None else _fake_tables.install(self.fake_tables)
+        with installed:
+            try:
+                yield from _iter_tests(
+                    self.found_tests,
+                    self.workers,
+                    self.maxfail,
+                    self.async_workers,
+                    timeout=self.timeout,
+                    fixtures=fixtures,
+                    isolate=self.isolate,
+                    profile=bool(self.profile),
+                    memory=self.memory,
+                    memory_threshold=self.memory_threshold,
+                    leak_check=self.leak_check,
+                    factory=self.factory,
+                )
+            finally:
+                fixtures.close()
+
+    def _iter_shards(self):
+        """Run the shards in other processes, yielding results in collection order as shards finish"""
+        names = [_format_test_name(test) for test in self.found_tests]
+        modules = {name: test.__module__ for name, test in zip(names, self.found_tests)}
+        package_name = self.test_package if isinstance(self.test_package, str) else self.test_package.__name__
+        executor = self.shard_executor or ProcessPoolExecutor(max_workers=self.shards)
+        try:
+            shards = _history.shard(names, self.previous, self.shards)
+            futures = {
+                executor.submit(
+                    _run_shard,
+                    package_name,
+                    names_in_shard,
+                    self.shard_options,
+                    sorted({modules[name] for name in names_in_shard}),
+                ): (number, names_in_shard)
+                for number, names_in_shard in enumerate(shards, 1)
+            }
+            finished = dict()
+            stopped = set()
+            position = 0
+            for future in as_completed(futures):
+                number, names_in_shard = futures[future]
+                test_results, skipped = future.result()
+                for result in test_results:
+                    finished[result.test_name] = result
+                stopped.update(skipped)
+
+                # a shard that didn't collect a test must not look like a pass
+                for name in set(names_in_shard) - set(finished) - set(skipped):
+                    error = RuntimeError(f"not run by shard {number}, the shard process did not collect it")
+                    finished[name] = TestResult(False, name, error)
+
+                while position < len(names) and names[position] in finished:
+                    yield finished.pop(names[position])
+                    position += 1
+
+            # tests a shard stopped before running, ie. with maxfail, are left out as skipped
+            yield from (finished[name] for name in names[position:] if name in finished)
+        finally:
+            if self.shard_executor is None:
+                executor.shutdown(cancel_futures=True)
+
+    def __iter__(self):
+        test_results = list()
+        for result in self._iter_shards() if self.shards > 1 else self._iter_local():
+            test_results.append(result)
+            yield result
+
+        if not self.reset_benchmarks:
+            self.regressions = _history.regressions(self.previous, test_results, self.benchmark_threshold)
+        if self.history:
+            self.history.save(
+                self.app_key,
+                _history.record(
+                    self.previous, test_results, self.regressions, reset=self.reset_benchmarks, collected=self.collected
+                ),
+            )
+
+
+def _run_shard(package_name: str, select: list, options: dict, modules: list = ()) -> tuple:
+    """Run one shard of a sharded run in this process, returning results that can be sent back
+    Args:
+        package_name: dotted name of the test package
+        select: names of the tests in the shard
+        options: session options of the run
+        modules: modules of the tests, imported first since a fresh process hasn't imported the package's submodules
+
+    Returns: (list of TestResult, names of the tests collected but not run, ie. stopped by maxfail)
+    """
+    test_package = importlib.import_module(package_name)
+    for module_name in modules:
+        try:
+            importlib.import_module(module_name)
+        except ImportError:
+            # reported as not run by the shard
+            pass
+    session = _Session(test_package, select=select, history=False, **options)
+    test_results = list(session)
+    ran = {result.test_name for result in test_results}
+    skipped = [name for name in map(_format_test_name, session.found_tests) if name not in ran]
+    for result in test_results:
+        if result.profile is not None:
+            # the stream is stdout, which can't be pickled
+            result.profile.stream = None
+        try:
+            pickle.dumps(result.error)
+        except Exception:
+            result.error = RuntimeError(f"{type(result.error).__name__}: {result.error}")
+    return test_results, skipped
+
+
+def iter_run(test_package, **options):
+    """Run the test suite, yielding a TestResult for each test as it finishes
+    Results are yielded in collection order.
+    Args:
+        test_package: module where the tests reside
+        options: workers, discovery, select, keyword, history, last_failed, failed_first, maxfail, exitfirst,
+            isolate, fake_tables, benchmark_threshold, reset_benchmarks, profile, memory, memory_threshold, leak_check,
+            timeout, shards, shard_executor, seed, async_workers, see run
+
+    Example:
+        for result in auto.iter_run(tests):
+            if not result.success:
+                print(result)
+    """
+    yield from _Session(test_package, **options)
+
+
+def iter_report(
+    test_package,
+    quiet: bool = True,
+    header: str = None,
+    durations: int = None,
+    progress=None,
+    reporter="text",
+    **options,
+):
+    """Run the test suite, yielding the lines of the report as tests finish
+    Args:
+        see run
+    """
+    from .reporters import get_reporter
+
+    reporter = get_reporter(reporter, quiet, header, durations)
+    yield from reporter.begin()
 
     # Collect tests
-    found_tests = _find_tests(test_package)
-    n_tests = len(found_tests)
-    log.append(f"Collected {n_tests} tests\n")
+    session = _Session(test_package, **options)
+    n_tests = len(session)
+    yield from reporter.start(session)
 
     # Run the collected tests
-    test_results = [_run_test(test) for test in found_tests]
+    test_results = list()
+    start = time.perf_counter()
+    for result in session:
+        test_results.append(result)
+        if progress is not None:
+            progress(result, len(test_results), n_tests)
+        yield from reporter.result(result)
+    execution_time = time.perf_counter() - start
+
+    yield from reporter.finish(session, test_results, execution_time)
+
+
+def run(
+    test_package,
+    quiet: bool = True,
+    header: str = None,
+    durations: int = None,
+    progress=None,
+    reporter="text",
+    output: str = None,
+    **options,
+) -> str:
+    """Run the test suite, printing the report as tests finish
+    Args:
+        test_package: module where the tests reside
+        quiet: True will only display failed tests, False will include passing tests in results
+        header: Something to display at the top to help with identification defaults to Anvil Testing
+        durations: show the slowest N tests, module totals and a duration histogram. 0 shows all tests.
+        progress: optional callback, progress(result, n_done, n_tests), called as each test finishes
+        reporter: format of the report, 'text', 'json', 'junit' or a reporters.Reporter
+        output: path of a file to also write the report to, each line is written as soon as it is ready
+
+    Options:
+        workers: number of threads to run the tests on.  Tests marked with @serial opt out.
+        discovery: 'import' walks the imported modules, 'ast' parses the source and only imports modules with tests
+        select: only run these tests, ie. ['module/path::Class::test', 'module/path']
+            Unselected modules are not imported with ast discovery and unselected classes are never created.
+        keyword: only run tests with names matching the expression, ie. 'update and not missing'
+        history: where results are kept between runs, history.DataTableHistory or history.FileHistory
+            Defaults to the anvil_testing_history table when the app has one, False to not keep history.
+        last_failed: only run the tests that failed last time, runs everything if nothing failed
+        failed_first: run the tests that failed last time first, quickest failures first
+        maxfail: stop starting new tests after this many failures, tests that are already running finish
+        exitfirst: stop after the first failure, same as maxfail=1
+        isolate: 'transaction' runs each test in a transaction that is aborted afterwards
+            Tests marked @non_transactional have the rows they add deleted instead.
+            The report lists the tests that would have left rows behind.
+        fake_tables: run against in memory tables, see fake_tables.FakeAppTables
+            True uses the db_schema in the anvil.yaml of the app the tests belong to.
+        benchmark_threshold: flag benchmarks with a median this much slower than their baseline, 0.2 is 20%
+            Baselines are kept in the history and only move when a benchmark gets faster, a regression fails the run.
+        reset_benchmarks: True to replace the benchmark baselines with this run's, ie. after accepting a slow down
+        profile: True to run each test under cProfile and report the top 20 functions by cumulative time,
+            for the whole run and each of the 3 slowest tests.  A number sets how many functions are listed.
+        memory: True to trace each test's peak and retained memory with tracemalloc
+        memory_threshold: bytes, tests that peak above this are reported with their top allocation sites
+        leak_check: run each test this many times and report tests whose retained memory grows every time
+        timeout: seconds a test can run before it fails as timed out, tests marked with @timeout use their own
+            The report includes where the test was stuck and the run moves on, the test's thread is left running.
+        shards: split the tests into this many shards, balanced by their previous durations, and run each shard
+            in its own process.  Results are merged back in collection order.  maxfail applies within each shard.
+        shard_executor: executor to run the shards on, defaults to a ProcessPoolExecutor with a process per shard
+            ie. a ProcessPoolExecutor whose initializer connects each process over uplink
+        seed: seed for the values from factories, helpers.gen_int and helpers.gen_str.  The report shows the seed
+            of each run, pass it here to rerun with the same data.
+        async_workers: number of async def tests to run at once on an event loop, they take turns while awaiting.
+            By default each async test runs on its own event loop like any other test.
+
+    Returns: the full report
+    """
+    log = list()
+    with open(output, "w") if output else nullcontext() as f:
+        for line in iter_report(
+            test_package,
+            quiet=quiet,
+            header=header,
+            durations=durations,
+            progress=progress,
+            reporter=reporter,
+            **options,
+        ):
+            # lines are only printed from this thread so they stay in order
+            print(line)
+            log.append(line)
+            if f is not None:
+                f.write(line + "\n")
+                f.flush()
+    return "\n".join(log)
+
+
+@dataclass
+class LoadResult:
+    """Throughput and latency of a test called repeatedly at one level of concurrency"""
+
+    concurrency: int
+    calls: int
+    errors: int
+    elapsed: float
+    p50: float
+    p95: float
+    p99: float
+    error: Exception | None = None
+
+    @property
+    def ops_per_sec(self) -> float:
+        return self.calls / self.elapsed if self.elapsed else 0.0
+
+    @property
+    def error_rate(self) -> float:
+        return self.errors / self.calls if self.calls else 0.0
+
+
+def _load_level(test, concurrency: int, iterations: int = None, duration: float = None) -> LoadResult:
+    """Call the test from concurrency threads until iterations calls are made or duration seconds pass"""
+    fixtures = _Fixtures()
+    # keep class and module fixtures for every call of this level
+    fixtures.expect(test)
+    lock = threading.Lock()
+    remaining = [iterations]
+    results = list()
+
+    start = time.perf_counter()
+    deadline = None if duration is None else start + duration
 
-    # add results to output log according to quiet
-    log.extend(
-        str(result) for result in test_results if not result.success or not quiet
+    def worker():
+        while True:
+            if deadline is not None:
+                if time.perf_counter() >= deadline:
+                    return
+            else:
+                with lock:
+                    if remaining[0] <= 0:
+                        return
+                    remaining[0] -= 1
+            fixtures.expect(test)
+            results.append(_run_test(test, fixtures))
+
+    try:
+        threads = [threading.Thread(target=worker, daemon=True) for _ in range(concurrency)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - start
+    finally:
+        fixtures.close()
+
+    latencies = [result.duration for result in results] or [0.0]
+    failures = [result for result in results if not result.success]
+    return LoadResult(
+        concurrency=concurrency,
+        calls=len(results),
+        errors=len(failures),
+        elapsed=elapsed,
+        p50=_percentile(latencies, 50),
+        p95=_percentile(latencies, 95),
+        p99=_percentile(latencies, 99),
+        error=failures[0].error if failures else None,
     )
 
-    # Summary info
-    passed = sum(test_results)
-    failed = n_tests - passed
-    log.append(f"\n{passed}/{n_tests} passed")
-    log.append(f"{failed} failed tests")
-    result = " PASS " if not failed else " FAIL "
-    log.append(f"{result:=^50s}")
-
-    # I found this more reliable for printing to the console.
-    # Otherwise, printing as I went the lines would stack, get out of order, etc.
-    result = "\n".join(log)
-    print(result)
-    return result
+
+def load(
+    test,
+    test_package=None,
+    concurrency=1,
+    iterations: int = None,
+    duration: float = None,
+) -> list:
+    """Use a test as a load generator, printing throughput and latency at each level of concurrency
+    Args:
+        test: a test function, or the node id of a test collected from test_package, ie. 'module/path::Class::test'
+        test_package: module where the tests reside, needed when test is a node id
+        concurrency: number of threads calling the test at once, a list to step through several levels
+        iterations: calls to make at each level, defaults to 100
+        duration: seconds to keep calling the test at each level, instead of iterations
+
+    Returns: list of LoadResult, one per level of concurrency
+
+    Example:
+        auto.load('orders::test_place_order', tests, concurrency=[1, 4, 16], duration=10)
+    """
+    if iterations is not None and duration is not None:
+        raise ValueError("Give either iterations or duration, not both")
+    if iterations is None and duration is None:
+        iterations = 100
+
+    if isinstance(test, str):
+        found_tests = _collect(test_package, select=[test])
+        if len(found_tests) != 1:
+            raise ValueError(f"'{test}' selected {len(found_tests)} tests, load needs exactly one")
+        test = found_tests[0]
+    levels = concurrency if isinstance(concurrency, (list, tuple)) else [concurrency]
+
+    title = f" load {_format_test_name(test, 'tests')} "
+    print(f"{title:=^50s}")
+    print(f"{'threads':>8s} {'calls':>8s} {'ops/s':>9s} {'scaling':>8s} {'p50':>8s} {'p95':>8s} {'p99':>8s} {'errors':>7s}")
+    load_results = list()
+    for level in levels:
+        result = _load_level(test, level, iterations, duration)
+        load_results.append(result)
+        base = load_results[0].ops_per_sec
+        scaling = result.ops_per_sec / base if base else 0.0
+        print(
+            f"{level:8d} {result.calls:8d} {result.ops_per_sec:9.1f} {scaling:7.2f}x "
+            f"{_format_seconds(result.p50):>8s} {_format_seconds(result.p95):>8s} {_format_seconds(result.p99):>8s} "
+            f"{result.error_rate:7.1%}"
+        )
+
+    for result in load_results:
+        if result.error is not None:
+            print(f"First error at {result.concurrency} threads: {type(result.error).__name__}: {result.error}")
+    return load_results
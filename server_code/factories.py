@@ -0,0 +1,212 @@
+"""
+Seeded test data that doesn't collide.
+
+Every run is seeded and the seed is shown in the report, run again with auto.run(tests, seed=...) to get the same data.
+Each test draws from its own generator seeded from the run's seed and the test name,
+so a test gets the same values however many workers the run has.
+Values are unique across the whole run, ints and strings are never handed out twice.
+"""
+
+import contextvars
+import datetime
+import random
+import threading
+import warnings
+from collections import defaultdict
+from contextlib import contextmanager
+
+
+class _Used:
+    """Values handed out so far, shared by a factory and the factories made from it"""
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.values = defaultdict(set)
+
+
+class Factory:
+    """Seeded source of unique test values and rows
+    Args:
+        seed: any int or str, a random seed is picked when not given
+    """
+
+    def __init__(self, seed=None, _used: _Used = None):
+        self.seed = random.SystemRandom().randrange(2**32) if seed is None else seed
+        self._random = random.Random(self.seed)
+        self._used = _Used() if _used is None else _used
+
+    def child(self, name: str) -> "Factory":
+        """A factory seeded from this seed and name, that won't repeat values handed out by this factory"""
+        return Factory(f"{self.seed}:{name}", self._used)
+
+    def _unique(self, kind: str, space: int, n: int) -> list:
+        """n distinct numbers in range(space) that haven't been handed out for kind before"""
+        with self._used.lock:
+            used = self._used.values[(kind, space)]
+            if len(used) + n > space:
+                raise ValueError(f"Only {space - len(used)} unused values left, asked for {n}")
+
+            if 2 * n > space - len(used):
+                # most of what is left is wanted, pick from the unused values rather than retrying collisions
+                values = self._random.sample([value for value in range(space) if value not in used], n)
+                used.update(values)
+                return values
+
+            # spaces can be far larger than a list or range len() allows, ie. 16 ** 32
+            values = list()
+            while len(values) < n:
+                value = self._random.randrange(space)
+                if value not in used:
+                    used.add(value)
+                    values.append(value)
+            return values
+
+    def ints(self, n: int, n_digits: int = 10) -> list:
+        """n unique ints of upto n_digits"""
+        return self._unique("int", 10**n_digits, n)
+
+    def strs(self, n: int, n_characters: int = 10) -> list:
+        """n unique hex strings n_characters long"""
+        return [f"{value:0{n_characters}x}" for value in self._unique("str", 16**n_characters, n)]
+
+    def _repeated(self, kind: str, space: int) -> int:
+        """Any value once every value has been handed out"""
+        warnings.warn(f"All {space} {kind} values have been used, values will now repeat", stacklevel=3)
+        with self._used.lock:
+            return self._random.randrange(space)
+
+    def gen_int(self, n_digits: int = 10) -> int:
+        """A unique int of upto n_digits, values repeat with a warning once all of them have been used"""
+        try:
+            return self.ints(1, n_digits)[0]
+        except ValueError:
+            return self._repeated("int", 10**n_digits)
+
+    def gen_str(self, n_characters: int = 10) -> str:
+        """A unique hex string n_characters long, values repeat with a warning once all of them have been used"""
+        try:
+            return self.strs(1, n_characters)[0]
+        except ValueError:
+            return f"{self._repeated('str', 16**n_characters):0{n_characters}x}"
+
+    def _links(self, targets, n: int, k: int = None) -> list:
+        """n random picks from the target rows, each a list of upto k rows when k is given"""
+        if targets is None:
+            return [None if k is None else [] for _ in range(n)]
+
+        rows = list(targets.search() if hasattr(targets, "search") else targets)
+        with self._used.lock:
+            if k is None:
+                return [self._random.choice(rows) if rows else None for _ in range(n)]
+            return [self._random.sample(rows, min(k, len(rows))) for _ in range(n)]
+
+    def _values(self, column: dict, n: int, links: dict) -> list:
+        """n values for a column of the type given in anvil.yaml"""
+        column_type = column["type"]
+        if column_type == "string":
+            return self.strs(n)
+        if column_type == "number":
+            return self.ints(n)
+
+        with self._used.lock:
+            if column_type == "bool":
+                return [self._random.random() < 0.5 for _ in range(n)]
+            if column_type == "date":
+                start = datetime.date(2000, 1, 1)
+                return [start + datetime.timedelta(days=self._random.randrange(365 * 40)) for _ in range(n)]
+            if column_type == "datetime":
+                start = datetime.datetime(2000, 1, 1, tzinfo=datetime.timezone.utc)
+                seconds = 86400 * 365 * 40
+                return [start + datetime.timedelta(seconds=self._random.randrange(seconds)) for _ in range(n)]
+
+        if column_type == "simpleObject":
+            return [{"value": value} for value in self.strs(n)]
+        if column_type == "link_single":
+            return self._links(links.get(column["name"]), n)
+        if column_type == "link_multiple":
+            return self._links(links.get(column["name"]), n, k=3)
+        return [None] * n
+
+    def rows(self, n: int, columns, links: dict = None, **values) -> list:
+        """n row dicts with a value for each column, ready for add_row or helpers.temp_rows
+        Args:
+            n: number of rows
+            columns: from the db_schema in anvil.yaml, ie. helpers.load_db_schema(app)['my_table'],
+                or app_tables.my_table.list_columns()
+            links: {column_name: rows or table} to link to, link columns are left empty otherwise
+            values: fixed values for columns, ie. active=True
+        """
+        if isinstance(columns, dict):
+            columns = columns.get("columns", [])
+        links = links or dict()
+
+        generated = {
+            column["name"]: self._values(column, n, links) for column in columns if column["name"] not in values
+        }
+        return [dict(values, **{name: column[i] for name, column in generated.items()}) for i in range(n)]
+
+    def row(self, columns, links: dict = None, **values) -> dict:
+        """A row dict with a value for each column, see rows"""
+        return self.rows(1, columns, links, **values)[0]
+
+
+_default = Factory()
+# a context variable rather than a thread local, so async tests running together on one thread each get their own
+_factory = contextvars.ContextVar("anvil_testing_factory", default=None)
+
+
+def seed(value=None):
+    """Start over with a new seed, returning it.  A random seed is picked when not given."""
+    global _default
+    _default = Factory(value)
+    return _default.seed
+
+
+def current() -> Factory:
+    """The factory of the running test, otherwise the run's factory"""
+    return _factory.get() or _default
+
+
+@contextmanager
+def for_test(test_name: str, run_factory: Factory = None):
+    """Give the running test its own factory, seeded from the run's seed and the test name
+    Args:
+        test_name: name of the test
+        run_factory: the factory of the run, defaults to the one set by seed
+    """
+    factory = (run_factory or _default).child(test_name)
+    token = _factory.set(factory)
+    try:
+        yield factory
+    finally:
+        _factory.reset(token)
+
+
+def ints(n: int, n_digits: int = 10) -> list:
+    """n unique ints of upto n_digits
+
+    Example:
+        ids = factories.ints(1000)
+    """
+    return current().ints(n, n_digits)
+
+
+def strs(n: int, n_characters: int = 10) -> list:
+    """n unique hex strings n_characters long"""
+    return current().strs(n, n_characters)
+
+
+def rows(n: int, columns, links: dict = None, **values) -> list:
+    """n row dicts with a value for each column, see Factory.rows
+
+    Example:
+        schema = helpers.load_db_schema(my_app)
+        customers = factories.rows(100, schema['customers'])
+        orders = factories.rows(1000, schema['orders'], links={'customer': app_tables.customers})
+    """
+    return current().rows(n, columns, links, **values)
+
+
+def row(columns, links: dict = None, **values) -> dict:
+    """A row dict with a value for each column, see Factory.rows"""
+    return current().row(columns, links, **values)
@@ -0,0 +1,364 @@
+"""
+An in memory stand in for app_tables so logic tests can run quickly and off platform.
+
+Only what tests commonly rely on is supported:
+add_row, add_rows, get, search with equality, list_columns, delete, RowDeleted and Transaction with abort.
+Searches build an index for each column they use, so repeated lookups don't scan the table.
+"""
+
+import contextvars
+import functools
+import itertools
+import sys
+import threading
+from contextlib import contextmanager, nullcontext
+
+import anvil.tables as tables
+
+
+class FakeSearch(list):
+    """Rows returned from a search"""
+
+    def delete_all_rows(self):
+        for row in list(self):
+            row.delete()
+
+
+class FakeRow:
+    """A row of a FakeTable, behaves like an anvil.tables.Row"""
+
+    def __init__(self, table, row_id: int, data: dict):
+        self._table = table
+        self._row_id = row_id
+        self._data = data
+        self._deleted = False
+
+    def _check(self):
+        if self._deleted:
+            raise tables.RowDeleted("This row has been deleted")
+
+    def get_id(self) -> str:
+        self._check()
+        return f"[{self._table._table_id},{self._row_id}]"
+
+    def __getitem__(self, column: str):
+        self._check()
+        if column not in self._data:
+            raise KeyError(f"No such column '{column}'")
+        return self._data[column]
+
+    def __setitem__(self, column: str, value):
+        self.update(**{column: value})
+
+    def update(self, **kwargs):
+        self._check()
+        self._table._update(self, kwargs)
+
+    def delete(self):
+        self._check()
+        self._table._delete(self)
+
+    def __contains__(self, column: str) -> bool:
+        return column in self._data
+
+    def keys(self):
+        self._check()
+        return self._data.keys()
+
+    def items(self):
+        self._check()
+        return self._data.items()
+
+    def __iter__(self):
+        return iter(list(self.items()))
+
+    def __repr__(self):
+        state = "deleted" if self._deleted else self._data
+        return f"<FakeRow {self._table.name}[{self._row_id}] {state}>"
+
+
+class FakeTable:
+    """A data table held in memory"""
+
+    def __init__(self, app_tables, name: str, table_id: int, columns: list):
+        self._app_tables = app_tables
+        self.name = name
+        self._table_id = table_id
+        self._columns = [{"name": column["name"], "type": column["type"]} for column in columns]
+        self._rows = dict()
+        self._row_ids = itertools.count(1)
+
+        # column -> {value: {row_id: row}}, built the first time a column is searched
+        self._indexes = dict()
+        self._unindexable = set()
+
+    def list_columns(self) -> list:
+        return [dict(column) for column in self._columns]
+
+    def _check_columns(self, columns):
+        names = {column["name"] for column in self._columns}
+        unknown = set(columns) - names
+        if unknown:
+            raise KeyError(f"No such column {sorted(unknown)} in table '{self.name}'")
+
+    def add_row(self, **kwargs) -> FakeRow:
+        self._check_columns(kwargs)
+        with self._app_tables._lock:
+            data = {column["name"]: None for column in self._columns}
+            data.update(kwargs)
+            row = FakeRow(self, next(self._row_ids), data)
+            self._insert(row)
+            self._app_tables._journal(lambda: self._remove(row))
+            return row
+
+    def add_rows(self, rows: list) -> list:
+        return [self.add_row(**row) for row in rows]
+
+    def _insert(self, row):
+        row._deleted = False
+        self._rows[row._row_id] = row
+        for column, index in list(self._indexes.items()):
+            self._index_add(index, column, row)
+
+    def _remove(self, row):
+        row._deleted = True
+        self._rows.pop(row._row_id, None)
+        for column, index in list(self._indexes.items()):
+            self._index_remove(index, column, row)
+
+    def _update(self, row, values: dict):
+        self._check_columns(values)
+        with self._app_tables._lock:
+            previous = {column: row._data[column] for column in values}
+            self._set(row, values)
+            self._app_tables._journal(lambda: self._set(row, previous))
+
+    def _set(self, row, values: dict):
+        for column, value in values.items():
+            index = self._indexes.get(column)
+            if index is not None:
+                self._index_remove(index, column, row)
+            row._data[column] = value
+            if index is not None:
+                self._index_add(index, column, row)
+
+    def _delete(self, row):
+        with self._app_tables._lock:
+            self._remove(row)
+            self._app_tables._journal(lambda: self._insert(row))
+
+    def _index_add(self, index, column, row):
+        try:
+            index.setdefault(row._data[column], dict())[row._row_id] = row
+        except TypeError:
+            self._unindex(column)
+
+    def _index_remove(self, index, column, row):
+        try:
+            rows = index.get(row._data[column])
+        except TypeError:
+            self._unindex(column)
+            return
+        if rows is not None:
+            rows.pop(row._row_id, None)
+
+    def _unindex(self, column: str):
+        """Stop indexing a column once it holds a value that can't be hashed"""
+        self._indexes.pop(column, None)
+        self._unindexable.add(column)
+
+    def _index(self, column: str):
+        """The equality index of a column, None if its values can't be hashed"""
+        if column in self._unindexable:
+            return None
+
+        index = self._indexes.get(column)
+        if index is None:
+            index = dict()
+            for row in self._rows.values():
+                self._index_add(index, column, row)
+                if column in self._unindexable:
+                    return None
+            self._indexes[column] = index
+        return index
+
+    def search(self, *args, **kwargs) -> FakeSearch:
+        queries = [column for column, value in kwargs.items() if type(value).__module__.startswith("anvil.tables")]
+        if args or queries:
+            raise TypeError(
+                f"FakeTable '{self.name}' only supports searching by column equality, ie. search(name='ann'), "
+                f"not query operators {queries or list(args)}"
+            )
+        self._check_columns(kwargs)
+
+        with self._app_tables._lock:
+            # start from the smallest set of rows an index gives us, then check every column
+            candidates = self._rows
+            for column, value in kwargs.items():
+                index = self._index(column)
+                try:
+                    matches = index.get(value, {}) if index is not None else None
+                except TypeError:
+                    matches = None
+                if matches is not None and len(matches) < len(candidates):
+                    candidates = matches
+
+            # keep the order rows were added
+            rows = sorted(candidates.values(), key=lambda row: row._row_id)
+            return FakeSearch(
+                row for row in rows if all(row._data[column] == value for column, value in kwargs.items())
+            )
+
+    def get(self, **kwargs):
+        rows = self.search(**kwargs)
+        if len(rows) > 1:
+            raise LookupError(f"More than one row matched {kwargs} in table '{self.name}'")
+        return rows[0] if rows else None
+
+    def get_by_id(self, row_id: str):
+        row = self._rows.get(int(row_id.strip("[]").split(",")[1]))
+        if row is None:
+            raise tables.RowDeleted("This row has been deleted")
+        return row
+
+    def delete_all_rows(self):
+        self.search().delete_all_rows()
+
+    def __len__(self):
+        return len(self._rows)
+
+
+# transactions open in this thread or async task, innermost last, as (FakeAppTables, undo steps)
+_open_transactions = contextvars.ContextVar("anvil_testing_fake_transactions", default=())
+
+
+class FakeTransaction:
+    """Writes within the block are undone if the block raises or abort is called
+    Args:
+        relaxed: accepted for compatibility with tables.Transaction, it makes no difference here
+    """
+
+    def __init__(self, app_tables, relaxed: bool = False):
+        self._app_tables = app_tables
+        self._aborted = False
+
+    def __enter__(self):
+        self._app_tables._begin()
+        return self
+
+    def abort(self):
+        self._aborted = True
+
+    def __exit__(self, error_type, error, traceback):
+        self._app_tables._end(commit=error_type is None and not self._aborted)
+        return False
+
+
+class FakeAppTables:
+    """Stand in for anvil.tables.app_tables built from a db_schema
+
+    Example:
+        fake = FakeAppTables(helpers.load_db_schema(my_app))
+        fake.my_table.add_row(id='abc')
+    """
+
+    def __init__(self, db_schema: dict):
+        self._lock = threading.RLock()
+        self._tables = dict()
+        for table_id, (name, table_schema) in enumerate(db_schema.items(), 1):
+            columns = table_schema.get("columns", []) if isinstance(table_schema, dict) else table_schema
+            self._tables[name] = FakeTable(self, name, table_id, columns)
+
+    def _transaction(self) -> list | None:
+        """Undo steps of the innermost transaction open on these tables in this thread or task"""
+        for app_tables, undo in reversed(_open_transactions.get()):
+            if app_tables is self:
+                return undo
+        return None
+
+    def _journal(self, undo):
+        """Remember how to undo a write if we are within a transaction"""
+        steps = self._transaction()
+        if steps is not None:
+            steps.append(undo)
+
+    def _begin(self):
+        _open_transactions.set(_open_transactions.get() + ((self, list()),))
+
+    def _end(self, commit: bool):
+        opened = _open_transactions.get()
+        position = max(i for i, (app_tables, _) in enumerate(opened) if app_tables is self)
+        undo = opened[position][1]
+        _open_transactions.set(opened[:position] + opened[position + 1 :])
+        if commit:
+            # the outer transaction can still undo these writes
+            outer = self._transaction()
+            if outer is not None:
+                outer.extend(undo)
+        else:
+            with self._lock:
+                for step in reversed(undo):
+                    step()
+
+    def Transaction(self, relaxed: bool = False) -> FakeTransaction:
+        return FakeTransaction(self, relaxed)
+
+    def in_transaction(self, fn=None, *, relaxed: bool = False):
+        if fn is None:
+            return lambda fn: self.in_transaction(fn, relaxed=relaxed)
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with self.Transaction(relaxed):
+                return fn(*args, **kwargs)
+
+        return wrapper
+
+    def __getattr__(self, name: str) -> FakeTable:
+        try:
+            return self.__dict__["_tables"][name]
+        except KeyError:
+            raise AttributeError(f"No such app table: '{name}'") from None
+
+    def __getitem__(self, name: str) -> FakeTable:
+        return self._tables[name]
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._tables
+
+    def __iter__(self):
+        return iter(self._tables)
+
+
+@contextmanager
+def install(fake: FakeAppTables):
+    """Swap the fake in for app_tables, Transaction and batch operations until the block exits
+    Modules that imported app_tables directly are patched too.
+    in_transaction decorators that have already been applied still use the real tables,
+    helpers.temp_row and helpers.temp_writes open their transactions when they are called so they use the fake.
+    """
+    real = tables.app_tables
+    patches = [
+        (tables, "app_tables", fake),
+        (tables, "Transaction", fake.Transaction),
+        (tables, "in_transaction", fake.in_transaction),
+        (tables, "batch_delete", nullcontext),
+        (tables, "batch_update", nullcontext),
+    ]
+    for module in list(sys.modules.values()):
+        if module is not tables and getattr(module, "app_tables", None) is real:
+            patches.append((module, "app_tables", fake))
+
+    missing = object()
+    originals = [(target, name, getattr(target, name, missing)) for target, name, _ in patches]
+    try:
+        for target, name, value in patches:
+            setattr(target, name, value)
+        yield fake
+
+    finally:
+        for target, name, value in reversed(originals):
+            if value is missing:
+                delattr(target, name)
+            else:
+                setattr(target, name, value)
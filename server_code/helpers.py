@@ -1,44 +1,244 @@
 from anvil import tables
-from contextlib import contextmanager
-
+import anvil.server
+from contextlib import contextmanager, nullcontext
+from dataclasses import dataclass, field
+
+import os
+import statistics
+import sys
+import threading
 import time
 
+from . import factories
+from .auto import _current, _percentile, fixture
+
+
+def _column_index(table_columns) -> dict:
+    """Index the output of list_columns() by column name -> {name: type}"""
+    return {column["name"]: column["type"] for column in table_columns}
+
 
 def _verify_column(table_columns, expected_name, expected_type):
     """Check the table has a column with the expected name and type
     Args:
-        table_columns: output from app_tables.my_table.list_columns()
+        table_columns: output from app_tables.my_table.list_columns() or an index from _column_index
         expected_name: str, name of column
         expected_type: str, type of column
     """
+    if not isinstance(table_columns, dict):
+        table_columns = _column_index(table_columns)
+
+    if expected_name not in table_columns:
+        return f"column '{expected_name}' not found"
+
+    column_type = table_columns[expected_name]
+    if column_type == expected_type:
+        return ""
+    return f"column '{expected_name}' must be of type '{expected_type}' not '{column_type}'"
+
+
+class SchemaSnapshot:
+    """The columns of the app's tables, each table is fetched once and then reused
+
+    Use the schema_snapshot fixture to share one snapshot between all of the tests in a run.
+    """
+
+    def __init__(self):
+        self._tables = dict()
+        self._lock = threading.Lock()
+
+    def columns(self, table_name: str) -> dict | None:
+        """Column types of the table {name: type}, None if the table doesn't exist"""
+        with self._lock:
+            if table_name not in self._tables:
+                from anvil.tables import app_tables
+
+                if table_name in app_tables:
+                    self._tables[table_name] = _column_index(app_tables[table_name].list_columns())
+                else:
+                    self._tables[table_name] = None
+            return self._tables[table_name]
+
+
+@fixture(scope="session")
+def schema_snapshot():
+    """Session fixture sharing one SchemaSnapshot between the tests of a run
+
+    Example:
+        from anvil_testing.helpers import schema_snapshot
+
+        def test_schema(schema_snapshot):
+            diffs = verify_schema(EXPECTED, schema_snapshot)
+            assert not diffs, [str(diff) for diff in diffs.values()]
+    """
+    return SchemaSnapshot()
+
+
+@dataclass
+class TableDiff:
+    """Differences between the expected and actual columns of a table"""
+
+    table_name: str
+    table_missing: bool = False
+    missing: list = field(default_factory=list)
+    wrong_type: dict = field(default_factory=dict)
+    extra: list = field(default_factory=list)
+
+    def __bool__(self):
+        return bool(self.table_missing or self.missing or self.wrong_type or self.extra)
+
+    def errors(self) -> list:
+        """Human readable list of the differences"""
+        if self.table_missing:
+            return [f"Table '{self.table_name}' not found."]
+
+        errors = [f"column '{name}' not found" for name in self.missing]
+        errors.extend(
+            f"column '{name}' must be of type '{expected}' not '{actual}'"
+            for name, (expected, actual) in self.wrong_type.items()
+        )
+        errors.extend(f"column '{name}' not expected" for name in self.extra)
+        return errors
+
+    def __str__(self):
+        return "\n".join([f"Table: {self.table_name}"] + [f" - {error}" for error in self.errors()])
+
+
+def _expected_columns(table_schema) -> list:
+    """Columns of a table from a db_schema entry, either {'columns': [...]} or the list of columns"""
+    if isinstance(table_schema, dict):
+        return table_schema.get("columns", [])
+    return table_schema
+
+
+def verify_schema(expected: dict, snapshot: SchemaSnapshot = None, ignore_extra: bool = False) -> dict:
+    """Verify many tables at once against a db_schema mapping in the shape of anvil.yaml
+    Each table's columns are fetched once, then every expected column is a dictionary lookup.
+    Args:
+        expected: {table_name: {'columns': [{'name': column_name, 'type': column_type}, ...]}, ...}
+            The columns can also be given directly as the list.
+        snapshot: SchemaSnapshot to reuse, ie. from the schema_snapshot fixture
+        ignore_extra: True to not report columns in the table that are not expected
+
+    Returns: {table_name: TableDiff} of the tables that don't match
+        if the dict is empty, no differences were found.
+    """
+    if snapshot is None:
+        snapshot = SchemaSnapshot()
+
+    diffs = dict()
+    for table_name, table_schema in expected.items():
+        diff = TableDiff(table_name)
+        columns = snapshot.columns(table_name)
+
+        if columns is None:
+            diff.table_missing = True
+
+        else:
+            expected_names = set()
+            for column in _expected_columns(table_schema):
+                name = column["name"]
+                expected_names.add(name)
+                if name not in columns:
+                    diff.missing.append(name)
+                elif columns[name] != column["type"]:
+                    diff.wrong_type[name] = (column["type"], columns[name])
+
+            if not ignore_extra:
+                diff.extra = sorted(set(columns) - expected_names)
+
+        if diff:
+            diffs[table_name] = diff
+
+    return diffs
+
+
+_db_schemas = dict()
+_db_schemas_lock = threading.Lock()
+
+
+def _anvil_yaml_path(source) -> str:
+    """Find the anvil.yaml of an app
+    Args:
+        source: any module of the app, the app's directory or the path to anvil.yaml
+    """
+    if isinstance(source, str):
+        if os.path.isdir(source):
+            return os.path.join(source, "anvil.yaml")
+        return source
+
+    # the app package's __init__.py sits next to anvil.yaml
+    app_package = sys.modules[source.__name__.partition(".")[0]]
+    return os.path.join(os.path.dirname(os.path.abspath(app_package.__file__)), "anvil.yaml")
+
+
+def load_db_schema(source) -> dict:
+    """Load the db_schema of an app's anvil.yaml, parsed once and kept in memory until the file changes
+    Args:
+        source: any module of the app, the app's directory or the path to anvil.yaml
+
+    Returns: {table_name: {'columns': [{'name': column_name, 'type': column_type, ...}, ...], ...}}
+    """
+    path = _anvil_yaml_path(source)
+    mtime = os.path.getmtime(path)
+
+    with _db_schemas_lock:
+        cached = _db_schemas.get(path)
+        if cached is not None and cached[0] == mtime:
+            return cached[1]
+
+        # only needed here so the rest of helpers works without it
+        import yaml
 
-    for column in table_columns:
-        if column["name"] == expected_name:
-            if column["type"] == expected_type:
-                return ""
-            else:
-                return f"column '{expected_name}' must be of type '{expected_type}' not '{column['type']}'"
-    return f"column '{expected_name}' not found"
+        with open(path) as f:
+            db_schema = (yaml.safe_load(f) or {}).get("db_schema") or {}
 
+        # older apps list the tables rather than mapping them by name
+        if isinstance(db_schema, list):
+            db_schema = {table["name"]: table for table in db_schema}
 
-def verify_table(table_name: str, expected_columns: dict):
+        _db_schemas[path] = (mtime, db_schema)
+        return db_schema
+
+
+def verify_app_schema(
+    source, snapshot: SchemaSnapshot = None, tables: list = None, ignore_extra: bool = False
+) -> dict:
+    """Verify the live tables against the db_schema declared in an app's anvil.yaml
+    Pass a module of a dependency to check the parent app has the tables the dependency needs.
+    Args:
+        source: any module of the app, the app's directory or the path to anvil.yaml
+        snapshot: SchemaSnapshot to reuse, ie. from the schema_snapshot fixture
+        tables: only verify these tables, defaults to every declared table
+        ignore_extra: True to not report columns in the table that are not declared
+
+    Returns: {table_name: TableDiff} of the tables that don't match
+        if the dict is empty, no differences were found.
+    """
+    db_schema = load_db_schema(source)
+    if tables is not None:
+        db_schema = {name: db_schema.get(name, {}) for name in tables}
+    return verify_schema(db_schema, snapshot, ignore_extra)
+
+
+def verify_table(table_name: str, expected_columns: dict, snapshot: SchemaSnapshot = None):
     """Verify the table has all of the expected columns
     Args:
         table: str, name of table
         expected_columns: [{'name': row_name, 'type': row_type}, ...]
             Grab this from the console with app_tables.my_table.list_columns()
+        snapshot: optional SchemaSnapshot to reuse the columns fetched by other tests
 
     Returns: List of human readable errors
         if the list is empty, no errors were found.
     """
-    from anvil.tables import app_tables
+    if snapshot is None:
+        snapshot = SchemaSnapshot()
 
-    if table_name not in app_tables:
+    table_columns = snapshot.columns(table_name)
+    if table_columns is None:
         return f"Table '{table_name}' not found."
 
-    table = app_tables[table_name]
-
-    table_columns = table.list_columns()
     errors = list()
     for column in expected_columns:
         result = _verify_column(table_columns, column["name"], column["type"])
@@ -51,7 +251,6 @@ def verify_table(table_name: str, expected_columns: dict):
     return False
 
 
-@tables.in_transaction
 @contextmanager
 def temp_row(table, **kwargs):
     """Create a temporary row in table that will be automatically deleted
@@ -67,7 +266,9 @@ def temp_row(table, **kwargs):
         # Once you exit the with block the row will be deleted
         row.get_id() <- This will raise a RowDeleted exception!
     """
-    row = table.add_row(**kwargs)
+    # the transaction is opened when called, not decorated, so it is whatever tables.Transaction is at the time
+    with tables.Transaction():
+        row = table.add_row(**kwargs)
     try:
         yield row
     finally:
@@ -78,7 +279,78 @@ def temp_row(table, **kwargs):
             pass
 
 
-@tables.in_transaction
+def _add_rows(table, rows: list) -> list:
+    """Add many rows to the table with as few round trips as the runtime allows"""
+    add_rows = getattr(table, "add_rows", None)
+    if add_rows is not None:
+        return list(add_rows(rows))
+    return [table.add_row(**row) for row in rows]
+
+
+def _delete_rows(rows: list):
+    """Delete rows in one batch, ignoring rows that were already deleted"""
+    batch_delete = getattr(tables, "batch_delete", nullcontext)
+    try:
+        with batch_delete():
+            for row in rows:
+                row.delete()
+
+    except tables.RowDeleted:
+        # something deleted a row within the block, fall back to one at a time
+        for row in rows:
+            try:
+                row.delete()
+            except tables.RowDeleted:
+                pass
+
+
+@contextmanager
+def temp_rows(table, rows: list):
+    """Create many temporary rows in one transaction that will be automatically deleted together
+    Args:
+        table: app_table to create the rows within
+        rows: list of row properties, ie. [{'id': 1234, 'name': 'john'}, {'id': 5678, 'name': 'jane'}]
+
+    Example:
+        with temp_rows(my_table, [{'id': i} for i in range(50)]) as rows:
+            assert len(my_table.search()) >= 50
+
+        # Once you exit the with block the rows are deleted
+    """
+    with temp_dataset({table: rows}) as dataset:
+        yield dataset[table]
+
+
+@contextmanager
+def temp_dataset(dataset: dict):
+    """Create temporary rows in several tables in one transaction that will be automatically deleted
+    Tables are filled in the order given and emptied in reverse so rows can link to earlier tables.
+    Args:
+        dataset: {table: [row properties, ...], ...} where table is the table name or an app_table
+
+    Returns: {table: [rows, ...], ...} with the same keys as the dataset
+
+    Example:
+        with temp_dataset({'customers': customers, 'orders': orders}) as rows:
+            customer = rows['customers'][0]
+    """
+    from anvil.tables import app_tables
+
+    created = dict()
+    try:
+        with tables.Transaction():
+            for key, rows in dataset.items():
+                table = app_tables[key] if isinstance(key, str) else key
+                created[key] = _add_rows(table, rows)
+
+        yield created
+
+    finally:
+        # delete our temporary rows
+        for rows in reversed(list(created.values())):
+            _delete_rows(rows)
+
+
 @contextmanager
 def temp_writes():
     """Create temporary writes to the table that will be discarded after the with block exits
@@ -142,15 +414,228 @@ def raises(expected_error, msg: str | None = None):
         pass
 
 
+@dataclass
+class BenchmarkStats:
+    """Time per call of a benchmarked function, in seconds"""
+
+    name: str
+    iterations: int
+    rounds: int
+    min: float
+    median: float
+    p95: float
+    stdev: float
+
+    def as_dict(self) -> dict:
+        return {
+            "iterations": self.iterations,
+            "rounds": self.rounds,
+            "min": round(self.min, 9),
+            "median": round(self.median, 9),
+            "p95": round(self.p95, 9),
+            "stdev": round(self.stdev, 9),
+        }
+
+
+def _time_calls(fn, iterations: int) -> float:
+    start = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    return time.perf_counter() - start
+
+
+def benchmark(
+    fn, name: str = None, rounds: int = 10, warmup: int = 1, min_round_time: float = 0.01
+) -> BenchmarkStats:
+    """Time a function, calling it enough times that each round can be measured accurately
+    Within a test the stats are added to the report and kept in the history for the test and branch.
+    Later runs flag the benchmark if its median is slower than the best baseline, see auto.run benchmark_threshold.
+    Args:
+        fn: function to time, called without arguments
+        name: to tell several benchmarks in one test apart, defaults to the function name
+        rounds: number of timed rounds the stats are taken from
+        warmup: calls made before timing starts, to fill caches and open connections
+        min_round_time: seconds each round should last, the calls per round are calibrated to reach it
+
+    Example:
+        def test_lookup_speed():
+            stats = helpers.benchmark(lambda: find_customer("abc"), name="find_customer")
+            assert stats.median < 0.01, f"find_customer is too slow {stats}"
+    """
+    for _ in range(warmup):
+        fn()
+
+    # double the calls per round until a round takes long enough to time
+    iterations = 1
+    elapsed = _time_calls(fn, iterations)
+    while elapsed < min_round_time:
+        scale = 2 if elapsed <= 0 else min(10, max(2, min_round_time / elapsed))
+        iterations = int(iterations * scale) + 1
+        elapsed = _time_calls(fn, iterations)
+
+    times = [_time_calls(fn, iterations) / iterations for _ in range(rounds)]
+
+    if name is None:
+        name = getattr(fn, "__name__", "benchmark")
+        name = "benchmark" if name == "<lambda>" else name
+    stats = BenchmarkStats(
+        name=name,
+        iterations=iterations,
+        rounds=rounds,
+        min=min(times),
+        median=statistics.median(times),
+        p95=_percentile(times, 95),
+        stdev=statistics.stdev(times) if rounds > 1 else 0.0,
+    )
+
+    benchmarks = getattr(_current, "benchmarks", None)
+    if benchmarks is not None:
+        key, n = name, 1
+        while key in benchmarks:
+            n += 1
+            key = f"{name}#{n}"
+        benchmarks[key] = stats
+    return stats
+
+
 def gen_int(n_digits: int = 10) -> int:
-    """Create a random int upto n_digits"""
-    v = time.time_ns() + int(str(time.time_ns())[::-1])
-    return v % (10**n_digits - 1)
+    """Create a random int upto n_digits, not repeated within a run and reproducible from the run's seed
+    Once all 10 ** n_digits values have been used, ie. after 100 calls of gen_int(2), values repeat with a warning.
+    Use factories.ints for many at once.
+    """
+    return factories.current().gen_int(n_digits)
 
 
 def gen_str(n_characters: int = 10) -> str:
-    """Create a random string n_characters long"""
-    return hex(gen_int())[2 : n_characters + 2]
+    """Create a random string n_characters long, not repeated within a run and reproducible from the run's seed
+    Once all 16 ** n_characters values have been used values repeat with a warning.
+    Use factories.strs for many at once.
+    """
+    return factories.current().gen_str(n_characters)
+
+
+def _query_flag(query: dict, name: str) -> bool:
+    """Read a true/false url query parameter"""
+    return str(query.get(name, False)).lower() in {'1', 'true'}
+
+
+def _run_options(query: dict) -> dict:
+    """Convert the url query parameters of the test webpage into auto.run options"""
+    options = dict()
+
+    # allow ?quiet=True in url to set quiet status
+    options['quiet'] = _query_flag(query, 'quiet')
+
+    # allow ?workers=8 in url to run the tests concurrently
+    try:
+        options['workers'] = int(query.get('workers', 1))
+    except ValueError:
+        options['workers'] = 1
+
+    # allow ?async_workers=20 in url to run async tests together on an event loop
+    try:
+        options['async_workers'] = int(query.get('async_workers', 1))
+    except ValueError:
+        options['async_workers'] = 1
+
+    # allow ?durations=10 in url to show the slowest tests
+    try:
+        options['durations'] = int(query['durations'])
+    except (KeyError, ValueError):
+        options['durations'] = None
+
+    # allow ?discovery=ast to find tests without importing every test module
+    options['discovery'] = query.get('discovery', 'import')
+
+    # allow ?select=module/path::test_a,module/path::TestB to run specific tests
+    select = query.get('select')
+    options['select'] = [node for node in select.split(',') if node] if select else None
+
+    # allow ?keyword=update and not missing to run tests with matching names
+    options['keyword'] = query.get('keyword') or None
+
+    # allow ?last_failed=true or ?failed_first=true to rerun failures
+    options['last_failed'] = _query_flag(query, 'last_failed')
+    options['failed_first'] = _query_flag(query, 'failed_first')
+
+    # allow ?maxfail=5 or ?exitfirst=true to stop early on a broken deploy
+    try:
+        options['maxfail'] = int(query.get('maxfail', 0))
+    except ValueError:
+        options['maxfail'] = 0
+    options['exitfirst'] = _query_flag(query, 'exitfirst')
+
+    # allow ?isolate=transaction to undo the rows each test writes
+    options['isolate'] = query.get('isolate') or None
+
+    # allow ?fake_tables=true to run against in memory tables built from anvil.yaml
+    options['fake_tables'] = _query_flag(query, 'fake_tables')
+
+    # allow ?benchmark_threshold=0.1 to flag benchmarks more than 10% slower than their baseline
+    try:
+        options['benchmark_threshold'] = float(query['benchmark_threshold'])
+    except (KeyError, ValueError):
+        pass
+
+    # allow ?reset_benchmarks=true to accept this run's benchmarks as the new baselines
+    options['reset_benchmarks'] = _query_flag(query, 'reset_benchmarks')
+
+    # allow ?profile=true or ?profile=30 to profile each test and list the top functions
+    profile = query.get('profile', '')
+    options['profile'] = int(profile) if profile.isdigit() else _query_flag(query, 'profile')
+
+    # allow ?memory=true to trace the memory each test allocates, ?leak_check=5 to repeat each test 5 times
+    options['memory'] = _query_flag(query, 'memory')
+    for name in ('memory_threshold', 'leak_check'):
+        try:
+            options[name] = int(query[name])
+        except (KeyError, ValueError):
+            pass
+
+    # allow ?seed=1234 to rerun with the same generated data
+    if query.get('seed'):
+        seed = query['seed']
+        options['seed'] = int(seed) if seed.isdigit() else seed
+
+    # allow ?format=json or ?format=junit for a machine readable report
+    options['reporter'] = query.get('format', 'text')
+
+    # allow ?timeout=10 to fail tests that run longer than 10 seconds
+    try:
+        options['timeout'] = float(query['timeout'])
+    except (KeyError, ValueError):
+        pass
+
+    return options
+
+
+@anvil.server.background_task
+def _anvil_testing_run(package_name: str, header: str, options: dict) -> str:
+    """Run the test package in a background task, publishing results to the task state as they finish
+    Args:
+        package_name: importable name of the test package, ie. tests.__name__
+        header: string to put on first line of the report
+        options: keyword arguments for auto.run
+    """
+    import importlib
+    import anvil_testing
+
+    tests = importlib.import_module(package_name)
+    log = list()
+    anvil.server.task_state['log'] = log
+    anvil.server.task_state['done'] = 0
+    anvil.server.task_state['total'] = None
+
+    def progress(result, n_done, n_tests):
+        anvil.server.task_state['done'] = n_done
+        anvil.server.task_state['total'] = n_tests
+
+    for line in anvil_testing.auto.iter_report(tests, header=header, progress=progress, **options):
+        log.append(line)
+        # reassign so the task state is sent on
+        anvil.server.task_state['log'] = log
+
+    return "\n".join(log)
 
 
 def create_test_webpage(tests, endpoint: str, static_app_id: str, header: str = None):
@@ -162,6 +647,27 @@ def create_test_webpage(tests, endpoint: str, static_app_id: str, header: str =
     I would love to find a better way to do this...
 
     You can add a ?quiet=true to your test url to show only the failed tests.
+    Add ?workers=8 to run the tests on a pool of 8 threads.
+    Add ?async_workers=20 to run upto 20 async tests at once on an event loop.
+    Add ?durations=10 to show the 10 slowest tests.
+    Add ?discovery=ast to find tests by parsing the source and only import the modules with tests.
+    Add ?select=module/path::test_a,module/path::TestB to run specific tests.
+    Add ?keyword=update and not missing to run the tests with names matching the expression.
+    Add ?last_failed=true to only run the tests that failed last time or ?failed_first=true to run them first.
+    Add ?maxfail=5 to stop after 5 failed tests or ?exitfirst=true to stop after the first.
+    Add ?isolate=transaction to run each test in a transaction that is aborted afterwards.
+    Add ?fake_tables=true to run against in memory tables built from the db_schema in anvil.yaml.
+    Add ?benchmark_threshold=0.1 to flag benchmarks more than 10% slower than their baseline.
+    Add ?reset_benchmarks=true to replace the benchmark baselines with this run's.
+    Add ?profile=true to run each test under cProfile and list the functions that took the most time,
+    or ?profile=30 to list 30 of them.
+    Add ?memory=true to report the tests that peak over ?memory_threshold=1000000 bytes with their allocation sites.
+    Add ?leak_check=5 to run each test 5 times and report the tests whose retained memory keeps growing.
+    Add ?timeout=10 to fail tests that run for longer than 10 seconds and move on to the next test.
+    Add ?seed=1234 to rerun with the generated data of the run that showed seed 1234.
+    Add ?format=json or ?format=junit for a report CI can read rather than the text report.
+    Add ?background=true to run the tests in a background task.  The page redirects to
+    {endpoint}/run/<run_id> which shows results as they finish and refreshes until the run is complete.
     
     Args:
         tests: the test directory typically from an import statement
@@ -179,20 +685,60 @@ def create_test_webpage(tests, endpoint: str, static_app_id: str, header: str =
     from anvil import app
     
     if "debug" in app.environment.tags and app.id == static_app_id:
-        import anvil.server
-
         # Display where tests can be run in the server console
         print("Tests can be run here:")
         print(f"{anvil.server.get_app_origin('debug')}{endpoint}")
         
+        def content_type(query):
+            from .reporters import FORMATS, TextReporter
+
+            reporter = FORMATS.get(query.get('format'), TextReporter)
+            return {'Content-Type': reporter.content_type}
+
         @anvil.server.route(endpoint)
         def run(*args, **kwargs) -> anvil.server.HttpResponse:
             import anvil_testing
 
-            # allow ?quiet=True in url to set quiet status
-            quiet = kwargs.get('quiet', False)
-            if quiet:
-               quiet = str(quiet).lower() in {'1', 'true'}
-            
-            results = anvil_testing.auto.run(tests, quiet=quiet, header=header)            
-            return anvil.server.HttpResponse(body=results)
+            options = _run_options(kwargs)
+
+            # allow ?background=true to launch the run and return right away
+            if _query_flag(kwargs, 'background'):
+                task = anvil.server.launch_background_task(
+                    '_anvil_testing_run', tests.__name__, header, options
+                )
+                run_id = task.get_id()
+                url = f"{anvil.server.get_app_origin('debug')}{endpoint}/run/{run_id}"
+                if 'format' in kwargs:
+                    url += f"?format={kwargs['format']}"
+                return anvil.server.HttpResponse(
+                    body=f"Started test run {run_id}\nResults: {url}",
+                    headers={'Refresh': f"1; url={url}"},
+                )
+
+            results = anvil_testing.auto.run(tests, header=header, **options)
+            return anvil.server.HttpResponse(body=results, headers=content_type(kwargs))
+
+        @anvil.server.route(f"{endpoint}/run/:run_id")
+        def run_status(run_id, **kwargs) -> anvil.server.HttpResponse:
+            task = anvil.server.get_background_task(run_id)
+            status = task.get_termination_status()
+            if status == 'completed':
+                return anvil.server.HttpResponse(body=task.get_return_value(), headers=content_type(kwargs))
+
+            # partial results so far
+            state = task.get_state() or dict()
+            log = list(state.get('log', []))
+            total = state.get('total')
+            if status is None:
+                progress = "collecting tests" if total is None else f"{state.get('done', 0)}/{total} tests run"
+                log.append(f"\nRunning: {progress}")
+                return anvil.server.HttpResponse(
+                    body="\n".join(log), headers={'Refresh': '2'}
+                )
+
+            # the task failed, was killed or went missing
+            log.append(f"\nTest run {status} after {state.get('done', 0)}/{total} tests")
+            error = task.get_error()
+            if error is not None:
+                log.append(f"{type(error).__name__}: {error}")
+            return anvil.server.HttpResponse(body="\n".join(log))
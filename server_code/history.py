@@ -0,0 +1,197 @@
+"""
+Remember the outcome of each test between runs.
+
+History is kept per app and branch so last failed and failed first runs only look at their own results.
+"""
+
+import datetime
+import json
+import os
+import threading
+
+
+HISTORY_TABLE = "anvil_testing_history"
+
+
+class DataTableHistory:
+    """Store test history in a data table, one row per app and branch
+    The table needs the columns:
+        app_key: string
+        results: simpleObject
+        updated: datetime
+    """
+
+    def __init__(self, table_name: str = HISTORY_TABLE):
+        self.table_name = table_name
+
+    def _table(self):
+        from anvil.tables import app_tables
+
+        if self.table_name not in app_tables:
+            raise LookupError(
+                f"Table '{self.table_name}' not found, add it to your app to keep test history."
+            )
+        return app_tables[self.table_name]
+
+    def load(self, app_key: str) -> dict:
+        """Get the previous results {test_name: {'success': bool, 'duration': float}}"""
+        row = self._table().get(app_key=app_key)
+        if row is None:
+            return dict()
+        return dict(row["results"] or {})
+
+    def save(self, app_key: str, results: dict):
+        """Replace the stored results of app_key"""
+        table = self._table()
+        now = datetime.datetime.now(datetime.timezone.utc)
+        row = table.get(app_key=app_key)
+        if row is None:
+            table.add_row(app_key=app_key, results=results, updated=now)
+        else:
+            row.update(results=results, updated=now)
+
+
+class FileHistory:
+    """Store test history in a local json file, useful when running over uplink"""
+
+    def __init__(self, path: str = ".anvil_testing_history.json"):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def _read(self) -> dict:
+        try:
+            with open(self.path) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return dict()
+
+    def load(self, app_key: str) -> dict:
+        """Get the previous results {test_name: {'success': bool, 'duration': float}}"""
+        with self._lock:
+            return self._read().get(app_key, dict())
+
+    def save(self, app_key: str, results: dict):
+        """Replace the stored results of app_key"""
+        with self._lock:
+            data = self._read()
+            data[app_key] = results
+
+            # write then move so a failed write doesn't lose the history
+            temp_path = f"{self.path}.tmp"
+            with open(temp_path, "w") as f:
+                json.dump(data, f, indent=1, sort_keys=True)
+            os.replace(temp_path, self.path)
+
+
+def default_backend():
+    """The history table if the app has one, otherwise history is not kept"""
+    from anvil.tables import app_tables
+
+    if HISTORY_TABLE in app_tables:
+        return DataTableHistory()
+    return None
+
+
+def record(
+    previous: dict, test_results, regressed: dict = None, reset: bool = False, collected: set = None
+) -> dict:
+    """Merge the outcome of test_results into the previous history
+    A benchmark baseline only moves when the benchmark gets faster, so a slow down spread over many runs is still
+    measured against the best run.
+    Args:
+        previous: history from a backend
+        test_results: list of TestResult
+        regressed: from regressions, these benchmarks keep their previous baseline
+        reset: True to replace the baselines with this run's benchmarks, ie. after an accepted slow down
+        collected: names of every test in the suite, from a run of all the tests.
+            Tests that have since been renamed or deleted are dropped so their old failures don't linger.
+    """
+    regressed = regressed or dict()
+    results = dict(previous)
+    if collected is not None:
+        results = {name: outcome for name, outcome in results.items() if name in collected}
+    for result in test_results:
+        outcome = {
+            "success": result.success,
+            "duration": round(result.duration, 6),
+        }
+        if result.benchmarks:
+            baselines = previous.get(result.test_name, {}).get("benchmarks", {})
+            benchmarks = dict()
+            for name, stats in result.benchmarks.items():
+                baseline = baselines.get(name)
+                improved = baseline is None or stats.median < baseline["median"]
+                if reset or (improved and (result.test_name, name) not in regressed):
+                    benchmarks[name] = stats.as_dict()
+                else:
+                    benchmarks[name] = baseline
+            outcome["benchmarks"] = benchmarks
+        results[result.test_name] = outcome
+    return results
+
+
+def regressions(previous: dict, test_results, threshold: float) -> dict:
+    """Benchmarks with a median slower than their stored baseline by more than threshold
+    Args:
+        previous: history from a backend
+        test_results: list of TestResult
+        threshold: allowed slow down, 0.2 flags benchmarks more than 20% slower
+
+    Returns: {(test_name, benchmark_name): (baseline_median, median)}
+    """
+    found = dict()
+    for result in test_results:
+        baselines = previous.get(result.test_name, {}).get("benchmarks", {})
+        for name, stats in (result.benchmarks or {}).items():
+            baseline = baselines.get(name)
+            if baseline and stats.median > baseline["median"] * (1 + threshold):
+                found[(result.test_name, name)] = (baseline["median"], stats.median)
+    return found
+
+
+def failed(previous: dict) -> set:
+    """Names of the tests that failed last time they were run"""
+    return {name for name, outcome in previous.items() if not outcome["success"]}
+
+
+def failed_first(found_tests, previous: dict, name=lambda test: test) -> list:
+    """Order tests so those that failed last time run first, quickest failures first
+    The remaining tests keep their collection order.
+    Args:
+        found_tests: collected tests
+        previous: history from a backend
+        name: function to get the test name of a test
+    """
+    failures = failed(previous)
+    first = [test for test in found_tests if name(test) in failures]
+    first.sort(key=lambda test: previous[name(test)]["duration"])
+    rest = [test for test in found_tests if name(test) not in failures]
+    return first + rest
+
+
+def shard(test_names: list, previous: dict, n_shards: int) -> list:
+    """Split tests into shards that should take about the same time, using their previous durations
+    Tests without history are assumed to take the median duration.  Each shard keeps the collection order.
+    Args:
+        test_names: names of the collected tests in collection order
+        previous: history from a backend
+        n_shards: number of shards to split the tests into
+
+    Returns: list of lists of test names, empty shards are left out
+    """
+    known = sorted(previous[name]["duration"] for name in test_names if name in previous)
+    default = known[len(known) // 2] if known else 1.0
+
+    def duration(name):
+        return previous[name]["duration"] if name in previous else default
+
+    # longest first, each onto the shard with the least work so far
+    totals = [0.0] * n_shards
+    shards = [list() for _ in range(n_shards)]
+    for name in sorted(test_names, key=duration, reverse=True):
+        index = totals.index(min(totals))
+        shards[index].append(name)
+        totals[index] += duration(name)
+
+    order = {name: index for index, name in enumerate(test_names)}
+    return [sorted(names, key=order.get) for names in shards if names]
@@ -0,0 +1,219 @@
+"""
+Formats for the report of a test run.
+
+Each reporter returns the lines of its report as the run progresses, so the report can be written while tests finish.
+auto.run uses the TextReporter unless given another, ie. auto.run(tests, reporter='junit').
+"""
+
+import json
+from xml.sax.saxutils import escape, quoteattr
+
+from anvil import app
+
+from .auto import (
+    _format_benchmarks,
+    _format_durations,
+    _format_header,
+    _format_memory,
+    _format_profile,
+    _format_stray_rows,
+)
+
+
+class Reporter:
+    """Base of the report formats, each step returns the lines to add to the report"""
+
+    content_type = "text/plain"
+
+    def begin(self) -> list:
+        """Before the tests are collected"""
+        return []
+
+    def start(self, session) -> list:
+        """Once the tests are collected"""
+        return []
+
+    def result(self, result) -> list:
+        """As each test finishes, in collection order"""
+        return []
+
+    def finish(self, session, test_results: list, execution_time: float) -> list:
+        """After the last test"""
+        return []
+
+
+def _summary(session, test_results: list, execution_time: float) -> dict:
+    passed = sum(test_results)
+    failed = len(test_results) - passed
+    return {
+        "collected": len(session),
+        "passed": passed,
+        "failed": failed,
+        "skipped": len(session) - len(test_results),
+        "benchmark_regressions": len(session.regressions),
+        "collection_time": round(session.collection_time, 6),
+        "execution_time": round(execution_time, 6),
+        "success": not failed and not session.regressions,
+    }
+
+
+class TextReporter(Reporter):
+    """The human readable report
+    Args:
+        quiet: True will only display failed tests, False will include passing tests
+        header: Something to display at the top to help with identification defaults to Anvil Testing
+        durations: show the slowest N tests, module totals and a duration histogram. 0 shows all tests.
+    """
+
+    def __init__(self, quiet: bool = True, header: str = None, durations: int = None):
+        self.quiet = quiet
+        self.header = header
+        self.durations = durations
+
+    def begin(self) -> list:
+        return list(_format_header(self.header))
+
+    def start(self, session) -> list:
+        return session.notes + [f"Collected {len(session)} tests\n"]
+
+    def result(self, result) -> list:
+        if not result.success or not self.quiet:
+            return [str(result)]
+        return []
+
+    def finish(self, session, test_results: list, execution_time: float) -> list:
+        log = list()
+        if self.durations is not None:
+            log.extend(_format_durations(test_results, self.durations))
+
+        if session.isolate:
+            log.extend(_format_stray_rows(test_results))
+
+        log.extend(_format_benchmarks(test_results, session.regressions))
+
+        if session.profile:
+            log.extend(_format_profile(test_results, session.profile))
+
+        if session.memory:
+            log.extend(_format_memory(test_results, session.memory_threshold))
+
+        # Summary info
+        summary = _summary(session, test_results, execution_time)
+        log.append(f"\n{summary['passed']}/{summary['collected']} passed")
+        log.append(f"{summary['failed']} failed tests")
+        if summary["skipped"]:
+            log.append(
+                f"{summary['skipped']} tests skipped, stopped after {summary['failed']} failed tests "
+                f"(maxfail={session.maxfail})"
+            )
+        if session.regressions:
+            log.append(f"{len(session.regressions)} benchmark regressions")
+        log.append(f"collection {session.collection_time:.3f}s, execution {execution_time:.3f}s")
+        outcome = " PASS " if summary["success"] else " FAIL "
+        log.append(f"{outcome:=^50s}")
+        return log
+
+
+def _record(result) -> dict:
+    """A test result as plain json types"""
+    record = {
+        "name": result.test_name,
+        "success": result.success,
+        "duration": round(result.duration, 6),
+        "cpu_time": round(result.cpu_time, 6),
+        "error_type": result.error_type,
+        "message": result.message or None,
+        "timed_out": result.timed_out,
+    }
+    if result.stray_rows is not None:
+        record["stray_rows"] = result.stray_rows
+    if result.memory is not None:
+        record["memory"] = {"peak": result.memory["peak"], "retained": result.memory["retained"]}
+    if result.benchmarks:
+        record["benchmarks"] = {name: stats.as_dict() for name, stats in result.benchmarks.items()}
+    return record
+
+
+class JsonReporter(Reporter):
+    """A json document with a record per test, written a test at a time
+    {"app": ..., "notes": [...], "tests": [{"name": ..., "success": ..., "duration": ..., ...}, ...], "summary": {...}}
+    """
+
+    content_type = "application/json"
+
+    def __init__(self):
+        self._first = True
+
+    def start(self, session) -> list:
+        opening = json.dumps({"app": f"{app.id}:{app.branch}", "notes": session.notes})
+        # leave the object open so the tests can follow
+        return [opening[:-1] + ', "tests": [']
+
+    def result(self, result) -> list:
+        line = json.dumps(_record(result))
+        if not self._first:
+            line = "," + line
+        self._first = False
+        return [line]
+
+    def finish(self, session, test_results: list, execution_time: float) -> list:
+        return [f'], "summary": {json.dumps(_summary(session, test_results, execution_time))}}}']
+
+
+class JUnitReporter(Reporter):
+    """JUnit XML for CI, a testcase is written as each test finishes
+    The failure counts are left off the testsuite since they aren't known when it starts, CI tools count the testcases.
+    """
+
+    content_type = "application/xml"
+
+    def __init__(self, header: str = None):
+        self.header = header
+
+    def begin(self) -> list:
+        return ['<?xml version="1.0" encoding="UTF-8"?>']
+
+    def start(self, session) -> list:
+        name = quoteattr(self.header or f"{app.id}:{app.branch}")
+        return ["<testsuites>", f"<testsuite name={name} tests=\"{len(session)}\">"]
+
+    def result(self, result) -> list:
+        *path, name = result.test_name.split("::")
+        classname = ".".join(path).replace("/", ".")
+        line = f"<testcase classname={quoteattr(classname)} name={quoteattr(name)} time=\"{result.duration:.6f}\""
+        if result.success:
+            return [line + "/>"]
+
+        # assertions are failures, anything else went wrong running the test
+        tag = "failure" if isinstance(result.error, AssertionError) else "error"
+        message = result.message
+        error_type = quoteattr(result.error_type or "AssertionError")
+        first_line = quoteattr(message.splitlines()[0] if message else "")
+        return [
+            line + ">",
+            f"<{tag} type={error_type} message={first_line}>{escape(message)}</{tag}>",
+            "</testcase>",
+        ]
+
+    def finish(self, session, test_results: list, execution_time: float) -> list:
+        return ["</testsuite>", "</testsuites>"]
+
+
+FORMATS = {"text": TextReporter, "json": JsonReporter, "junit": JUnitReporter}
+
+
+def get_reporter(reporter="text", quiet: bool = True, header: str = None, durations: int = None) -> Reporter:
+    """The reporter for a format name, reporters are passed through
+    Args:
+        reporter: 'text', 'json', 'junit' or a Reporter
+        quiet, header, durations: options of the text report, the header also names the junit testsuite
+    """
+    if isinstance(reporter, Reporter):
+        return reporter
+    if reporter == "text":
+        return TextReporter(quiet, header, durations)
+    if reporter == "junit":
+        return JUnitReporter(header)
+    if reporter == "json":
+        return JsonReporter()
+    raise ValueError(f"Unknown report format '{reporter}', expected one of {sorted(FORMATS)}")